@@ -0,0 +1,291 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from kb_index import KnowledgeIndex, atomic_write, exact_search, index_paths, top_k_indices
+from compressed_index import BinarySearcher, Float16Searcher, Int8Searcher
+
+try:
+    import hnswlib
+except ImportError:  # hnswlib opsional; backend IVF (NumPy) selalu tersedia
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# Di bawah ukuran ini brute-force matmul lebih cepat dan exact, jadi backend 'auto' tidak membangun ANN
+EXACT_SEARCH_THRESHOLD = 20000
+
+
+class ExactSearcher:
+    """Brute-force search atas seluruh matrix. Dipakai untuk corpus kecil dan sebagai baseline recall."""
+    name = 'exact'
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def search(self, query_embeddings, k):
+        return exact_search(self.embeddings, query_embeddings, k)
+
+
+class IVFSearcher:
+    """
+    Inverted File index (NumPy): matrix dipartisi dengan spherical k-means menjadi nlist cluster.
+    Saat query hanya nprobe cluster terdekat yang diskor, sehingga biaya query ~ n * nprobe / nlist.
+    nprobe lebih besar = recall lebih tinggi, latency lebih besar.
+    """
+    name = 'ivf'
+
+    def __init__(self, embeddings, centroids, list_offsets, list_ids, nprobe=8):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @staticmethod
+    def _assign(embeddings, centroids, batch_size=65536):
+        """Cluster terdekat untuk setiap baris, diproses per batch supaya matrix skor tidak terlalu besar"""
+        assignments = np.empty(len(embeddings), dtype=np.int32)
+        for start in range(0, len(embeddings), batch_size):
+            block = np.asarray(embeddings[start:start + batch_size], dtype=np.float32)
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    @classmethod
+    def build(cls, embeddings, nlist=None, nprobe=8, n_iter=20, sample_size=None, seed=0):
+        """Latih coarse quantizer dengan k-means pada sampel, lalu kelompokkan semua baris ke inverted list"""
+        n = len(embeddings)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, sample_size or 256 * nlist)
+        sample_ids = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = np.asarray(embeddings[sample_ids], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            # Cluster kosong diisi ulang dengan titik sampel acak
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        assignments = cls._assign(embeddings, centroids)
+        list_ids = np.argsort(assignments, kind='stable').astype(np.int64)
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=list_offsets[1:])
+        return cls(embeddings, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    def search(self, query_embeddings, k):
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        nprobe = min(self.nprobe, self.nlist)
+        probes = top_k_indices(query_embeddings @ self.centroids.T, nprobe)
+
+        # Hasil di-pad dengan -1 / -inf jika cluster yang diprobe berisi kurang dari k baris
+        indices = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+        scores = np.full((len(query_embeddings), k), -np.inf, dtype=np.float32)
+        for row, (query, lists) in enumerate(zip(query_embeddings, probes)):
+            candidates = np.concatenate([
+                self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in lists
+            ])
+            if not len(candidates):
+                continue
+            candidates.sort()  # akses memory-map berurutan
+            candidate_scores = np.asarray(self.embeddings[candidates], dtype=np.float32) @ query
+            best = top_k_indices(candidate_scores, k)
+            indices[row, :len(best)] = candidates[best]
+            scores[row, :len(best)] = candidate_scores[best]
+        return indices, scores
+
+    def save(self, path, index_id=None):
+        """index_id: identitas matrix sumber (KnowledgeIndex.matrix_hash), dicek lagi saat load"""
+        meta = {'count': len(self.embeddings), 'nprobe': self.nprobe, 'index_id': index_id}
+        atomic_write(path, lambda f: np.savez(
+            f, centroids=self.centroids, list_offsets=self.list_offsets,
+            list_ids=self.list_ids, meta=np.array(json.dumps(meta)),
+        ))
+
+    @classmethod
+    def load(cls, path, embeddings, nprobe=None, index_id=None):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['count'] != len(embeddings):
+                raise ValueError(f"IVF index {path} was built for {meta['count']} rows, index has {len(embeddings)}")
+            if meta.get('index_id') != index_id:
+                raise ValueError(f"IVF index {path} was built from a different index matrix")
+            return cls(embeddings, data['centroids'], data['list_offsets'], data['list_ids'],
+                       nprobe=nprobe or meta['nprobe'])
+
+
+class HNSWSearcher:
+    """Graph index HNSW lewat library hnswlib (opsional). ef_search lebih besar = recall lebih tinggi."""
+    name = 'hnsw'
+
+    def __init__(self, index, ef_search=64):
+        self.index = index
+        self.ef_search = ef_search
+
+    @property
+    def ef_search(self):
+        return self._ef_search
+
+    @ef_search.setter
+    def ef_search(self, value):
+        self._ef_search = value
+        self.index.set_ef(value)
+
+    @staticmethod
+    def _require_hnswlib():
+        if hnswlib is None:
+            raise ImportError("The 'hnsw' backend requires hnswlib (pip install hnswlib)")
+
+    @classmethod
+    def build(cls, embeddings, M=16, ef_construction=200, ef_search=64, batch_size=100000):
+        cls._require_hnswlib()
+        index = hnswlib.Index(space='ip', dim=embeddings.shape[1])
+        index.init_index(max_elements=len(embeddings), M=M, ef_construction=ef_construction)
+        for start in range(0, len(embeddings), batch_size):
+            block = np.asarray(embeddings[start:start + batch_size], dtype=np.float32)
+            index.add_items(block, np.arange(start, start + len(block)))
+        return cls(index, ef_search=ef_search)
+
+    def search(self, query_embeddings, k):
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        k = min(k, self.index.get_current_count())
+        self.index.set_ef(max(self.ef_search, k))
+        labels, distances = self.index.knn_query(query_embeddings, k=k)
+        # Space 'ip' mengembalikan jarak 1 - dot product
+        return labels.astype(np.int64), (1.0 - distances).astype(np.float32)
+
+    def save(self, path, index_id=None):
+        """
+        File graph hnswlib tidak punya tempat untuk metadata, jadi index_id disimpan di sidecar
+        <path>.meta.json yang ditulis setelah graph (graph baru dengan sidecar lama tetap ditolak saat load)
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        os.close(fd)
+        try:
+            self.index.save_index(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        meta = {'count': self.index.get_current_count(), 'index_id': index_id}
+        atomic_write(path + '.meta.json', lambda f: json.dump(meta, f), mode='w')
+
+    @classmethod
+    def load(cls, path, embeddings, ef_search=64, index_id=None):
+        cls._require_hnswlib()
+        with open(path + '.meta.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('index_id') != index_id:
+            raise ValueError(f"HNSW index {path} was built from a different index matrix")
+        index = hnswlib.Index(space='ip', dim=embeddings.shape[1])
+        index.load_index(path, max_elements=len(embeddings))
+        if index.get_current_count() != len(embeddings):
+            raise ValueError(f"HNSW index {path} has {index.get_current_count()} rows, index has {len(embeddings)}")
+        return cls(index, ef_search=ef_search)
+
+
+# float16 / int8 / binary: codes terkompresi di RAM + rescoring full precision (lihat compressed_index.py)
+SEARCHERS = {'exact': ExactSearcher, 'ivf': IVFSearcher, 'hnsw': HNSWSearcher,
+             'float16': Float16Searcher, 'int8': Int8Searcher, 'binary': BinarySearcher}
+ANN_FILE_SUFFIX = {'ivf': '.ivf.npz', 'hnsw': '.hnsw.bin',
+                   'float16': '.float16.npz', 'int8': '.int8.npz', 'binary': '.binary.npz'}
+
+
+def ann_path(index_path, backend):
+    """Lokasi file ANN yang disimpan berdampingan dengan index biner"""
+    base = index_paths(index_path)[0][:-4]
+    return base + ANN_FILE_SUFFIX[backend]
+
+
+def resolve_backend(backend, n_rows):
+    """'auto' memilih exact untuk corpus kecil, hnsw jika hnswlib terpasang, selain itu ivf"""
+    if backend != 'auto':
+        if backend not in SEARCHERS:
+            raise ValueError(f"Unknown search backend '{backend}'. Choose from: auto, {', '.join(SEARCHERS)}")
+        return backend
+    if n_rows < EXACT_SEARCH_THRESHOLD:
+        return 'exact'
+    return 'hnsw' if hnswlib is not None else 'ivf'
+
+
+def build_searcher(embeddings, backend='auto', **params):
+    """Bangun searcher baru di memory. params diteruskan ke build() (mis. nlist, nprobe, M, ef_search)"""
+    backend = resolve_backend(backend, len(embeddings))
+    if backend == 'exact' or not len(embeddings):
+        return ExactSearcher(embeddings)
+    return SEARCHERS[backend].build(embeddings, **params)
+
+
+def load_searcher(embeddings, index_path=None, backend='auto', index_id=None, **params):
+    """
+    Load searcher yang sudah dibangun dari disk jika ada dan cocok dengan index,
+    kalau tidak bangun ulang lalu simpan (best-effort) untuk start berikutnya.
+    index_id (KnowledgeIndex.matrix_hash) dicatat di file ANN; file dari matrix lain dibangun ulang.
+    """
+    backend = resolve_backend(backend, len(embeddings))
+    if backend == 'exact' or not len(embeddings):
+        return ExactSearcher(embeddings)
+
+    path = ann_path(index_path, backend) if index_path else None
+    query_params = {key: params[key] for key in ('nprobe', 'ef_search', 'rescore') if key in params}
+    if path and os.path.exists(path):
+        try:
+            return SEARCHERS[backend].load(path, embeddings, index_id=index_id, **query_params)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # TypeError: meta rusak / format lama (mis. field None atau bertipe lain)
+            logger.warning(f"Error loading {backend} index {path}: {e}. Rebuilding.")
+
+    searcher = build_searcher(embeddings, backend, **params)
+    if path:
+        try:
+            searcher.save(path, index_id=index_id)
+        except OSError as e:
+            logger.warning(f"Could not write {backend} index {path}: {e}")
+    return searcher
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an approximate nearest-neighbour index for a compiled knowledge base")
+    parser.add_argument("index_path", nargs="?", default="faq_index")
+    parser.add_argument("--backend", choices=[name for name in SEARCHERS if name != 'exact'], default='ivf')
+    parser.add_argument("--nlist", type=int, default=None, help="IVF: number of clusters (default 4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF: clusters scanned per query")
+    parser.add_argument("--M", type=int, default=16, help="HNSW: graph degree")
+    parser.add_argument("--ef-construction", type=int, default=200, help="HNSW: build-time beam width")
+    parser.add_argument("--ef-search", type=int, default=64, help="HNSW: query-time beam width")
+    parser.add_argument("--pca-dim", type=int, default=None, help="float16/int8/binary: PCA-reduce before compressing")
+    parser.add_argument("--rescore", type=int, default=100, help="float16/int8/binary: candidates rescored at float32")
+    args = parser.parse_args()
+
+    kb = KnowledgeIndex.load(args.index_path)
+    if args.backend == 'ivf':
+        params = {'nlist': args.nlist, 'nprobe': args.nprobe}
+    elif args.backend in ('float16', 'int8', 'binary'):
+        params = {'pca_dim': args.pca_dim, 'rescore': args.rescore}
+    else:
+        params = {'M': args.M, 'ef_construction': args.ef_construction, 'ef_search': args.ef_search}
+    searcher = build_searcher(kb.embeddings, args.backend, **params)
+    path = ann_path(args.index_path, args.backend)
+    searcher.save(path, index_id=kb.matrix_hash)
+    print(f"Built {args.backend} index over {len(kb)} entries into {path}")
@@ -1,119 +1,33 @@
 import streamlit as st
 import json
-import re
 import os
 import urllib.parse
-from bots import RAGChatbot # Assuming bot.py is in the same directory
-import html
+import uuid
+from kb_index import index_exists
+from catalog import CourseCatalog, file_signature
+from warmup import BackgroundLoader
 
 # --- Page Configuration ---
 st.set_page_config(layout="wide", page_title="Platform Edukasi AI", page_icon="🎓")
 
 # --- Global Variables / Data Loading ---
 COURSES_DATA = [] # Populated by load_and_parse_courses_from_json
-COURSE_CONTENT_DETAILS = {} # Populated by load_and_parse_courses_from_json
+COURSE_CATALOG = None # Populated by load_and_parse_courses_from_json (detail course di-parse saat dibuka)
 COURSES_PER_PAGE_DASHBOARD = 3
+COURSE_VECTORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "course_index") # dibuat dengan: python catalog.py
 
 # --- Helper Functions for Data Loading and Parsing ---
-def parse_course_content(content_text):
-    parsed = {
-        "overview": "",
-        "key_concepts": [],
-        "code_example": {"language": None, "code": ""},
-        "applications": []
-    }
-
-    # Pisahkan overview dari Key Concepts
-    overview_split = re.split(r'\n\s*Key Concepts:\s*\n', content_text, flags=re.IGNORECASE)
-    if len(overview_split) > 1:
-        parsed["overview"] = overview_split[0].strip()
-        rest = overview_split[1]
-    else:
-        parsed["overview"] = content_text.strip()
-        return parsed  # jika tidak ada bagian lain
-
-    # Pisahkan Key Concepts dari Code Example
-    key_split = re.split(r'\n\s*Code Example:\s*\n', rest, flags=re.IGNORECASE)
-    if len(key_split) > 1:
-        key_concepts_block = key_split[0].strip()
-        rest = key_split[1]
-    else:
-        key_concepts_block = rest.strip()
-        rest = ""
+@st.cache_resource(max_entries=2) # Satu katalog per versi file, di-share semua session
+def get_course_catalog(file_path, signature):
+    # signature (mtime, size) hanya dipakai sebagai cache key: file yang berubah di-parse ulang
+    return CourseCatalog.from_json(file_path)
 
-    parsed["key_concepts"] = [line.strip() for line in key_concepts_block.splitlines() if line.strip()]
-
-    # Pisahkan Code Example dari Applications
-    code_split = re.split(r'\n\s*Applications:\s*\n', rest, flags=re.IGNORECASE)
-    if len(code_split) > 1:
-        code_block = code_split[0].strip()
-        apps_block = code_split[1].strip()
-    else:
-        code_block = rest.strip()
-        apps_block = ""
-
-    # Ambil bahasa dan kode program
-    lang_match = re.search(r'(\w+):\s*```(?:\w+)?\s*\n([\s\S]*?)```', code_block, flags=re.IGNORECASE)
-    if lang_match:
-        parsed["code_example"]["language"] = lang_match.group(1).strip().lower()
-        parsed["code_example"]["code"] = html.unescape(
-            lang_match.group(2)
-        ).strip().replace('</p>', '').replace('</div>', '')
-
-    # Ambil Applications
-    if apps_block:
-        parsed["applications"] = [line.strip() for line in apps_block.splitlines() if line.strip()]
-
-    return parsed
-    
 def load_and_parse_courses_from_json(file_path="dataWeb.json"):
-    """Loads courses from JSON and populates global data structures."""
-    global COURSES_DATA, COURSE_CONTENT_DETAILS
+    """Loads the (cached) course catalog and populates global data structures."""
+    global COURSES_DATA, COURSE_CATALOG
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        raw_courses = data.get("courses", [])
-        
-        temp_courses_data = []
-        temp_course_content_details = {}
-        
-        for course_json in raw_courses:
-            course_id = course_json.get("id")
-            raw_content = course_json.get("content", "")
-            
-            if not course_id:
-                continue
-
-            # Create entry for COURSES_DATA (for cards)
-            title = course_id.replace("_", " ").replace("-", " ").title()
-            
-            # Extract description (e.g., first few sentences or up to a certain length)
-            # Simple extraction: first two non-empty lines.
-            content_lines = [line.strip() for line in raw_content.split('\n') if line.strip()]
-            description = " ".join(content_lines[:2]) if len(content_lines) > 1 else (content_lines[0] if content_lines else "No description available.")
-            description = (description[:200] + '...') if len(description) > 200 else description
-
-
-            # Extract topics from "Key Concepts" if possible, else use generic tags or id
-            parsed_content_for_topics = parse_course_content(raw_content) # Parse once
-            topics = parsed_content_for_topics.get("key_concepts", [])[:4] # Take first 4 key concepts as topics
-            if not topics: # Fallback topics
-                topics = [tag.strip() for tag in course_id.split('_')][:4]
-
-
-            temp_courses_data.append({
-                "id": course_id,
-                "title": title,
-                "description": description,
-                "topics": topics 
-            })
-            
-            # Store parsed content for detail view
-            temp_course_content_details[course_id] = parsed_content_for_topics
-            
-        COURSES_DATA = temp_courses_data
-        COURSE_CONTENT_DETAILS = temp_course_content_details
+        COURSE_CATALOG = get_course_catalog(file_path, file_signature(file_path))
+        COURSES_DATA = COURSE_CATALOG.courses
         
         if not COURSES_DATA:
             st.error(f"No courses loaded from {file_path}. Please check the file format and content.")
@@ -121,40 +35,77 @@ def load_and_parse_courses_from_json(file_path="dataWeb.json"):
     except FileNotFoundError:
         st.error(f"Error: The file {file_path} was not found.")
         COURSES_DATA = []
-        COURSE_CONTENT_DETAILS = {}
+        COURSE_CATALOG = None
     except json.JSONDecodeError:
         st.error(f"Error: Could not decode JSON from {file_path}. Please check for syntax errors.")
         COURSES_DATA = []
-        COURSE_CONTENT_DETAILS = {}
+        COURSE_CATALOG = None
     except Exception as e:
         st.error(f"An unexpected error occurred while loading courses: {e}")
         COURSES_DATA = []
-        COURSE_CONTENT_DETAILS = {}
+        COURSE_CATALOG = None
 
 # --- Chatbot Initialization ---
-@st.cache_resource # Cache the chatbot instance
-def get_chatbot_instance():
+def create_chatbot():
+    # Dipanggil di background thread (BackgroundLoader), jadi tidak boleh memanggil st.*
     # Ensure bot.py, faq.json, and best_embedding_model are accessible
     # GEMINI_API_KEY should be in .env file or environment variables
-    try:
-        # Construct absolute paths if necessary, assuming files are in the same dir as app.py
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        faq_file_path = os.path.join(script_dir, "faq.json")
-        model_path_dir = os.path.join(script_dir, "best_embedding_model")
-
-        if not os.path.exists(faq_file_path):
-            st.error(f"FAQ file not found: {faq_file_path}. Chatbot might not function correctly.")
-            # You might want to return a dummy chatbot or raise an error
-        if not os.path.isdir(model_path_dir):
-            st.error(f"Model directory not found: {model_path_dir}. Chatbot might not function correctly.")
-
-        chatbot = RAGChatbot(faq_file=faq_file_path, model_path=model_path_dir)
-        print("RAGChatbot instance created.")
-        return chatbot
-    except Exception as e:
-        st.error(f"Failed to initialize chatbot: {e}. Please ensure all dependencies and API keys are set.")
-        print(f"Chatbot initialization error: {e}")
+    from bots import RAGChatbot # Import berat (torch, Gemini client) baru terjadi di sini
+
+    # Construct absolute paths if necessary, assuming files are in the same dir as app.py
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    faq_file_path = os.path.join(script_dir, "faq.json")
+    index_path = os.path.join(script_dir, "faq_index")
+    model_path_dir = os.path.join(script_dir, "best_embedding_model")
+
+    if not index_exists(index_path) and not os.path.exists(faq_file_path):
+        print(f"Knowledge base not found: {index_path}.meta.json or {faq_file_path}. Chatbot might not function correctly.")
+    if not os.path.isdir(model_path_dir):
+        print(f"Model directory not found: {model_path_dir}. Chatbot might not function correctly.")
+
+    answer_cache_db = os.path.join(script_dir, "answer_cache.sqlite3")
+    translation_cache_db = os.path.join(script_dir, "translation_cache.sqlite3")
+    chatbot = RAGChatbot(faq_file=faq_file_path, model_path=model_path_dir, index_path=index_path,
+                         answer_cache_db=answer_cache_db, translation_cache_db=translation_cache_db)
+    print("RAGChatbot instance created.")
+    return chatbot
+
+@st.cache_resource # Satu loader per proses, di-share semua session
+def get_chatbot_loader():
+    return BackgroundLoader(create_chatbot, name="chatbot-warmup").start()
+
+def get_chatbot_instance():
+    """Chatbot yang sudah selesai warm-up, atau None selama model dan index masih di-load (tidak blocking)"""
+    loader = get_chatbot_loader()
+    return loader.result if loader.ready else None
+
+@st.cache_resource(max_entries=2) # Satu loader per versi katalog (signature), di-share semua session
+def get_course_vectors_loader(_catalog, signature):
+    chatbot_loader = get_chatbot_loader()
+
+    def prepare_course_vectors():
+        # Background thread: tunggu model chatbot, lalu load course vectors yang di-precompute offline.
+        # Jika file belum ada / basi (katalog atau model berubah), dibangun sekali dengan model yang sama
+        chatbot_loader.wait()
+        chatbot = chatbot_loader.result
+        if chatbot is None:
+            return False
+        encode_courses = lambda texts: chatbot.embedding_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        return _catalog.load_vectors(COURSE_VECTORS_PATH, encode_fn=encode_courses,
+                                     model_fingerprint=chatbot.model_fingerprint)
+
+    return BackgroundLoader(prepare_course_vectors, name="course-vectors").start()
+
+def semantic_course_search(query):
+    """Ranking course berdasarkan makna query dengan model embedding chatbot; None jika belum tersedia (tidak blocking)"""
+    chatbot = get_chatbot_instance()
+    if not chatbot or COURSE_CATALOG is None:
         return None
+    if not COURSE_CATALOG.has_vectors:
+        loader = get_course_vectors_loader(COURSE_CATALOG, COURSE_CATALOG.signature)
+        if not (loader.ready and loader.result):
+            return None
+    return [course for course, _ in COURSE_CATALOG.semantic_search(chatbot.encode_texts([query]))]
 
 # --- CSS Kustom ---
 # (CSS remains largely the same as your last version, with minor adjustments if needed)
@@ -408,6 +359,9 @@ def initialize_session_state():
     if 'selected_page' not in st.session_state:
         st.session_state.selected_page = query_params.get("page", "Dashboard")
     
+    if 'session_id' not in st.session_state: # Chat history chatbot disimpan per browser session
+        st.session_state.session_id = uuid.uuid4().hex
+
     if 'messages' not in st.session_state:
         st.session_state.messages = [{"role": "assistant", "content": "Hello! What do you want to learn today?"}]
     
@@ -417,7 +371,7 @@ def initialize_session_state():
     # Handle direct navigation to course detail via query params
     initial_course_id = query_params.get("course_id", None)
     if initial_course_id:
-        if any(course['id'] == initial_course_id for course in COURSES_DATA):
+        if COURSE_CATALOG is not None and initial_course_id in COURSE_CATALOG:
             st.session_state.selected_page = "Course List" # Force page to Course List
             st.session_state.selected_course_for_detail = initial_course_id
         else: # Clear invalid course_id from params
@@ -588,22 +542,33 @@ def display_dashboard():
     if st.button("See all the course list", use_container_width=True, key="dashboard_all_courses"):
         navigate_to("Course List")
 
-chatbot_instance = get_chatbot_instance()
-
 def display_chatbot():
     os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
     os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
     
-    chatbot_instance = get_chatbot_instance()
-    if not chatbot_instance:
-        st.error("Chatbot tidak dapat diinisialisasi. Mohon periksa konfigurasi.")
-        return
-
     st.markdown("<div style='text-align: center; margin-bottom: 2rem;'><h1 style='font-size: 2.5rem;'>AI Learning Assistant</h1></div>", unsafe_allow_html=True)
+
+    loader = get_chatbot_loader()
+    if loader.failed:
+        st.error(f"Failed to initialize chatbot: {loader.error}. Please ensure all dependencies and API keys are set.")
+        return
+    if not loader.ready:
+        # Model dan index masih di-load di background: tampilkan status warming up lalu cek lagi
+        st.info("🔥 The AI assistant is warming up. This only happens once after the server starts...")
+        st.chat_input("Ask about Computer Science", key="chatbot_input", disabled=True)
+        loader.wait(timeout=1.0)
+        st.rerun()
+    chatbot_instance = loader.result
     
     # Quick Action Buttons (Optional - can be removed if bot is robust)
     # st.markdown("### 💡 Pertanyaan Populer:") ... 
 
+    # Metrics pipeline (latency per stage, hit rate cache) hanya tampil dengan ?debug=1
+    if st.query_params.get("debug") == "1":
+        with st.expander("Pipeline metrics"):
+            st.json(chatbot_instance.metrics.snapshot())
+            st.code(chatbot_instance.metrics.to_prometheus(), language="text")
+
     # Chat Interface
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
@@ -615,15 +580,24 @@ def display_chatbot():
             st.markdown(prompt)
 
         with st.spinner("AI is thinking..."):
-            bot_response_text, contexts, _ = chatbot_instance.generate_response(prompt)
+            response_stream, contexts, _ = chatbot_instance.generate_response_stream(
+                prompt, session_id=st.session_state.session_id)
+
+        # Tampilkan jawaban secara bertahap begitu potongan dari Gemini tiba
+        with st.chat_message("assistant"):
+            bot_response_text = st.write_stream(response_stream)
         
         assistant_message_content = bot_response_text
 
+        # Jawaban langsung dari knowledge base (fast path tanpa Gemini) diberi penanda
+        if contexts and contexts[0].get('extractive'):
+            assistant_message_content += "\n\n<sub>📚 Answered directly from the course knowledge base</sub>"
+
         # Add link if relevant context found and it's a course ID
         if contexts and contexts[0]['similarity'] > 0.5: # Adjust threshold as needed
             relevant_course_id = contexts[0]['tag']
             # Check if this tag is a valid course ID from our loaded courses
-            matching_course = next((c for c in COURSES_DATA if c['id'] == relevant_course_id), None)
+            matching_course = COURSE_CATALOG.get(relevant_course_id) if COURSE_CATALOG else None
             if matching_course:
                 course_title = matching_course['title']
                 # Construct URL with query parameters. Page name needs to be URL encoded if it has spaces.
@@ -650,6 +624,8 @@ def display_course_list():
         return
 
     search_query = st.text_input("🔍  Search any CS topic", placeholder="Example: abstraction, python, error handling", key="course_search")
+    use_semantic_search = st.toggle("Semantic search", value=False, key="course_semantic_search",
+                                    help="Find topics by meaning, e.g. 'sorting fast' finds Quick Sort")
     
     stats_cols = st.columns(3) # Simplified stats
     total_topics_count = len(COURSES_DATA)
@@ -662,14 +638,16 @@ def display_course_list():
     st.markdown("<br>", unsafe_allow_html=True)
 
     filtered_courses = COURSES_DATA
-    if search_query:
-        sq_lower = search_query.lower()
-        filtered_courses = [
-            course for course in COURSES_DATA 
-            if sq_lower in course['title'].lower() or 
-               sq_lower in course['description'].lower() or
-               any(sq_lower in topic.lower() for topic in course.get('topics',[]))
-        ]
+    if search_query and COURSE_CATALOG is not None:
+        # Ranked search lewat inverted index; setiap kata dicocokkan sebagai prefix (search-as-you-type)
+        filtered_courses = COURSE_CATALOG.search(search_query)
+        semantic_courses = semantic_course_search(search_query) if use_semantic_search else None
+        if use_semantic_search and semantic_courses is None:
+            st.caption("Semantic search is still loading, showing keyword matches for now.")
+        if semantic_courses is not None:
+            # Match keyword / prefix judul tetap di atas; hasil semantic melengkapi di bawahnya
+            keyword_ids = {course['id'] for course in filtered_courses}
+            filtered_courses = filtered_courses + [c for c in semantic_courses if c['id'] not in keyword_ids]
 
     if not COURSES_DATA:
         st.info("Katalog topik sedang disiapkan. Silakan cek kembali nanti.")
@@ -707,8 +685,8 @@ def display_course_card_item(course): # Was display_course_card_detailed
 
 
 def show_course_detail(course_id):
-    course_meta = next((c for c in COURSES_DATA if c['id'] == course_id), None)
-    course_content = COURSE_CONTENT_DETAILS.get(course_id)
+    course_meta = COURSE_CATALOG.get(course_id) if COURSE_CATALOG else None
+    course_content = COURSE_CATALOG.detail(course_id) if COURSE_CATALOG else None
 
     if not course_meta or not course_content:
         st.error("Detail topik tidak ditemukan.")
@@ -760,6 +738,7 @@ def show_course_detail(course_id):
 
 # --- Main App Logic ---
 def main():
+    get_chatbot_loader() # Mulai warm-up chatbot di background; halaman lain tidak menunggu
     load_and_parse_courses_from_json() # Load data at the start
     initialize_session_state() # Initialize/update session state based on query_params AFTER data load
 
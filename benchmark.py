@@ -0,0 +1,269 @@
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+from language_id import STOPWORDS
+
+QUERY_KINDS = ('original', 'paraphrase', 'typo')
+LATENCY_STAGES = ('encode', 'search', 'lexical_search')
+
+# Parafrase sederhana berbasis template untuk pattern pertanyaan yang umum di data.json
+PARAPHRASE_RULES = [
+    (re.compile(r"^what is (?:an? |the )?(.+?)[?.!]*$"), ["explain {0}", "can you tell me about {0}", "{0} meaning"]),
+    (re.compile(r"^what are (?:the )?(.+?)[?.!]*$"), ["list the {0}", "tell me about {0}"]),
+    (re.compile(r"^(?:explain|describe|define) (?:an? |the )?(.+?)[?.!]*$"), ["what is {0}", "i want to learn about {0}"]),
+    (re.compile(r"^how (?:do|does|can) (.+?)[?.!]*$"), ["how can {0}", "steps for how {0}"]),
+    (re.compile(r"^why (?:is|are|do|does) (.+?)[?.!]*$"), ["what is the reason {0}", "why {0}"]),
+]
+KEYBOARD_NEIGHBORS = {
+    'a': 'qsz', 'b': 'vgn', 'c': 'xdv', 'd': 'sfe', 'e': 'wrd', 'f': 'dgr', 'g': 'fht', 'h': 'gjy', 'i': 'uok',
+    'j': 'hku', 'k': 'jli', 'l': 'ko', 'm': 'nj', 'n': 'bmh', 'o': 'ipl', 'p': 'ol', 'q': 'wa', 'r': 'etf',
+    's': 'adw', 't': 'ryg', 'u': 'yij', 'v': 'cbf', 'w': 'qes', 'x': 'zcs', 'y': 'tuh', 'z': 'xa',
+}
+
+
+def paraphrase(pattern, rng):
+    """Parafrase template dari satu pattern, atau None jika tidak ada rule yang cocok"""
+    text = ' '.join(pattern.lower().split())
+    for regex, templates in PARAPHRASE_RULES:
+        match = regex.match(text)
+        if match:
+            return rng.choice(templates).format(match.group(1))
+    return None
+
+
+def add_typos(text, rng, n_typos=1):
+    """Typo level karakter (hapus, tukar, ganti tombol tetangga, dobel) pada kata non-stopword >= 4 huruf"""
+    words = text.split()
+    candidates = [i for i, word in enumerate(words) if len(word) >= 4 and word.lower() not in STOPWORDS['en']]
+    if not candidates:
+        return None
+    for i in rng.sample(candidates, min(n_typos, len(candidates))):
+        word = words[i]
+        pos = rng.randrange(1, len(word) - 1)
+        op = rng.choice(('delete', 'swap', 'neighbor', 'double'))
+        if op == 'delete':
+            word = word[:pos] + word[pos + 1:]
+        elif op == 'swap':
+            word = word[:pos] + word[pos + 1] + word[pos] + word[pos + 2:]
+        elif op == 'neighbor' and word[pos].lower() in KEYBOARD_NEIGHBORS:
+            word = word[:pos] + rng.choice(KEYBOARD_NEIGHBORS[word[pos].lower()]) + word[pos + 1:]
+        else:
+            word = word[:pos] + word[pos] + word[pos:]
+        words[i] = word
+    return ' '.join(words)
+
+
+def generate_queries(data_file, kinds=QUERY_KINDS, limit=None, seed=0):
+    """
+    Query berlabel dari data.json: pattern asli, parafrase template dan versi dengan typo.
+    Label = tag intent asal. Mengembalikan list dict {query, tag, kind, source}; deterministik untuk seed yang sama.
+    """
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    rng = random.Random(seed)
+    sources = [(intent['tag'], pattern) for intent in data.get('intents', []) for pattern in intent.get('patterns', [])]
+
+    queries = []
+    for kind in kinds:
+        generated = []
+        for tag, pattern in sources:
+            if kind == 'original':
+                query = pattern
+            elif kind == 'paraphrase':
+                query = paraphrase(pattern, rng)
+            elif kind == 'typo':
+                query = add_typos(pattern, rng)
+            else:
+                raise ValueError(f"Unknown query kind '{kind}'. Choose from: {', '.join(QUERY_KINDS)}")
+            if query and (kind == 'original' or query.lower() != pattern.lower()):
+                generated.append({'query': query, 'tag': tag, 'kind': kind, 'source': pattern})
+        if limit and len(generated) > limit:
+            generated = rng.sample(generated, limit)
+        queries.extend(generated)
+    return queries
+
+
+def retrieval_metrics(ranks, k):
+    """recall@1, recall@k dan MRR dari rank (1-based) tag yang benar; None = tidak ditemukan"""
+    n = max(len(ranks), 1)
+    return {
+        'queries': len(ranks),
+        'recall@1': sum(1 for rank in ranks if rank == 1) / n,
+        f'recall@{k}': sum(1 for rank in ranks if rank and rank <= k) / n,
+        'mrr': sum(1.0 / rank for rank in ranks if rank) / n,
+    }
+
+
+def latency_summary(seconds):
+    """Percentile latency dalam milidetik"""
+    if not seconds:
+        return {'count': 0}
+    values = np.asarray(seconds) * 1000
+    return {
+        'count': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+    }
+
+
+def _stage_seconds(metrics):
+    """Total detik per stage dari histogram stage_seconds (selisih sebelum/sesudah = durasi satu query)"""
+    totals = {}
+    for item in metrics.snapshot()['histograms'].get('stage_seconds', []):
+        totals[item['labels'].get('stage')] = item['value']['sum']
+    return totals
+
+
+def run_benchmark(bot, queries, k=5, cold=True, warmup=5, max_failures=25):
+    """
+    Jalankan setiap query lewat search path chatbot (search_batch, sama dengan _search_context) satu per satu.
+    cold=True mengosongkan embedding cache sebelum setiap query supaya latency encode terukur.
+    Mengembalikan dict berisi metrik retrieval (total dan per kind), latency per stage, jalur retrieval,
+    dan contoh query yang gagal.
+    """
+    for query in queries[:warmup]:
+        bot.search_batch([query['query']], k)
+
+    ranks, ranks_by_kind = [], {}
+    latencies = {'total': []}
+    latencies.update({stage: [] for stage in LATENCY_STAGES})
+    paths, failures = {}, []
+    for query in queries:
+        if cold:
+            bot.embedding_cache.clear()
+        before = _stage_seconds(bot.metrics)
+        start = time.perf_counter()
+        contexts = bot.search_batch([query['query']], k)[0]
+        latencies['total'].append(time.perf_counter() - start)
+        after = _stage_seconds(bot.metrics)
+        for stage in LATENCY_STAGES:
+            if after.get(stage, 0.0) > before.get(stage, 0.0):
+                latencies[stage].append(after[stage] - before.get(stage, 0.0))
+
+        tags = list(dict.fromkeys(ctx['tag'] for ctx in contexts))[:k]
+        rank = tags.index(query['tag']) + 1 if query['tag'] in tags else None
+        ranks.append(rank)
+        ranks_by_kind.setdefault(query['kind'], []).append(rank)
+        path = contexts[0].get('retrieval', 'dense') if contexts else 'none'
+        paths[path] = paths.get(path, 0) + 1
+        if rank != 1 and len(failures) < max_failures:
+            failures.append({**query, 'rank': rank, 'top_tags': tags})
+
+    return {
+        'overall': retrieval_metrics(ranks, k),
+        'by_kind': {kind: retrieval_metrics(kind_ranks, k) for kind, kind_ranks in ranks_by_kind.items()},
+        'latency': {stage: latency_summary(values) for stage, values in latencies.items()},
+        'paths': paths,
+        'failures': failures,
+    }
+
+
+def compare(baseline, current, k, max_recall_drop=0.01):
+    """Bandingkan dengan hasil benchmark sebelumnya; mengembalikan list regresi (kosong jika aman)"""
+    regressions = []
+    for metric in ('recall@1', f'recall@{k}', 'mrr'):
+        old = baseline['overall'].get(metric)
+        new = current['overall'].get(metric)
+        if old is not None and new is not None and new < old - max_recall_drop:
+            regressions.append(f"{metric}: {old:.4f} -> {new:.4f}")
+    return regressions
+
+
+def _parse_params(items):
+    params = {}
+    for item in items or []:
+        key, _, value = item.partition('=')
+        try:
+            params[key] = json.loads(value)
+        except json.JSONDecodeError:
+            params[key] = value
+    return params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency of the chatbot search path")
+    parser.add_argument("--data", default="data.json", help="intents used to derive labeled queries")
+    parser.add_argument("--queries", default=None, help="JSON list of {query, tag, kind} instead of generated queries")
+    parser.add_argument("--write-queries", default=None, help="save the generated query set as JSON")
+    parser.add_argument("--kinds", nargs="+", choices=QUERY_KINDS, default=['paraphrase', 'typo'])
+    parser.add_argument("--limit", type=int, default=None, help="max queries per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index", default="faq_index")
+    parser.add_argument("--model", default="best_embedding_model")
+    parser.add_argument("--backend", default="auto", help="search_backend: exact, ivf, hnsw, float16, int8, binary, auto")
+    parser.add_argument("--search-param", action="append", metavar="KEY=VALUE", help="e.g. nprobe=8, rescore=100")
+    parser.add_argument("--encoder", default="torch", help="encoder_backend: torch, onnx, onnx-int8")
+    parser.add_argument("--retrieval", choices=['hybrid', 'dense'], default='hybrid')
+    parser.add_argument("--tag-aggregation", choices=['max', 'mean', 'none'], default='max')
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--warm", action="store_true", help="keep the embedding cache between queries")
+    parser.add_argument("--label", default=None, help="name of this run in the JSON output")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=None, help="previous results JSON; exit 1 if quality regressed")
+    parser.add_argument("--max-recall-drop", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = json.load(f)
+    else:
+        queries = generate_queries(args.data, args.kinds, args.limit, args.seed)
+        if args.write_queries:
+            with open(args.write_queries, 'w', encoding='utf-8') as f:
+                json.dump(queries, f, ensure_ascii=False, indent=2)
+
+    from bots import RAGChatbot
+    from build_kb import model_fingerprint
+
+    config = {
+        'index': args.index,
+        'model': args.model,
+        'model_fingerprint': model_fingerprint(args.model)[:16],
+        'search_backend': args.backend,
+        'search_params': _parse_params(args.search_param),
+        'encoder_backend': args.encoder,
+        'retrieval': args.retrieval,
+        'tag_aggregation': None if args.tag_aggregation == 'none' else args.tag_aggregation,
+        'k': args.k,
+        'cold_cache': not args.warm,
+    }
+    start = time.perf_counter()
+    bot = RAGChatbot(model_path=args.model, index_path=args.index, top_k=args.k, search_backend=args.backend,
+                     search_params=config['search_params'], encoder_backend=args.encoder, retrieval=args.retrieval,
+                     tag_aggregation=config['tag_aggregation'], answer_cache_size=0)
+    config['load_seconds'] = time.perf_counter() - start
+    config['searcher'] = bot.searcher.name
+
+    results = {'label': args.label, 'config': config, 'seed': args.seed}
+    results.update(run_benchmark(bot, queries, args.k, cold=not args.warm))
+
+    overall = results['overall']
+    print(f"{overall['queries']} queries  recall@1 {overall['recall@1']:.4f}  "
+          f"recall@{args.k} {overall[f'recall@{args.k}']:.4f}  MRR {overall['mrr']:.4f}")
+    for kind, metrics in results['by_kind'].items():
+        print(f"  {kind:<10} recall@1 {metrics['recall@1']:.4f}  recall@{args.k} {metrics[f'recall@{args.k}']:.4f}  "
+              f"MRR {metrics['mrr']:.4f}  ({metrics['queries']} queries)")
+    for stage, summary in results['latency'].items():
+        if summary['count']:
+            print(f"  {stage:<15} p50 {summary['p50_ms']:.2f} ms  p95 {summary['p95_ms']:.2f} ms  "
+                  f"p99 {summary['p99_ms']:.2f} ms  ({summary['count']} calls)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), results, args.k, args.max_recall_drop)
+        if regressions:
+            print("Quality regression vs baseline: " + "; ".join(regressions))
+            sys.exit(1)
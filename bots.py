@@ -1,42 +1,92 @@
+import asyncio
 import json
+import logging
 import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import google.generativeai as genai
-from googletrans import Translator, LANGUAGES
-from langdetect import detect
 import os
+import time
 from dotenv import load_dotenv
+from kb_index import KnowledgeIndex, index_exists, preprocess_text
+from encoders import load_encoder
+from build_kb import model_fingerprint, remove_stale_ann
+from ann_index import load_searcher
+from lexical_index import BM25Index, lexical_tokens, reciprocal_rank_fusion
+from caches import LRUCache, SemanticCache, TranslationCache
+from sessions import DEFAULT_SESSION, ConversationStore
+from language_id import LocalLanguageIdentifier
+from prompt_builder import PromptBuilder
+from metrics import Metrics, LATENCY_BUCKETS
+from small_talk import SmallTalkRouter
 
 load_dotenv()
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Menyembunyikan pesan INFO dan WARNING TensorFlow
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
-gemini_api_key = os.getenv("GEMINI_API_KEY")
+logger = logging.getLogger(__name__)
 
-# Konfigurasi Gemini dengan parameter creativity
-genai.configure(api_key=gemini_api_key)
+gemini_api_key = os.getenv("GEMINI_API_KEY")
 
-# Fungsi bantu untuk preprocessing teks
-def preprocess_text(text):
-    return ' '.join(text.lower().strip().split())
+# Dependensi berat (google.generativeai, googletrans, langdetect, sentence_transformers/torch) di-import
+# di dalam method yang membutuhkannya, supaya `import bots` murah dan app bisa dirender lebih dulu
+
+# Timeout default (detik) untuk setiap stage di agenerate_response
+DEFAULT_STAGE_TIMEOUTS = {
+    'route': 2.0,
+    'detect': 2.0,
+    'translate': 5.0,
+    'encode': 5.0,
+    'search': 5.0,
+    'prepare': 5.0,
+    'generate': 60.0,
+}
+
+# Kata pembingkai pertanyaan yang diabaikan saat mengecek apakah query hanya mengulang pattern / nama tag
+# untuk fast path extractive. Sengaja lebih sempit dari stop-word BM25: kata seperti "example", "quiz"
+# atau "simple" mengubah permintaan sehingga tetap dijawab Gemini
+EXTRACTIVE_FILLER_WORDS = frozenset({
+    'a', 'an', 'the', 'what', 'whats', 'is', 'are', 'was', 'define', 'definition', 'explain', 'describe',
+    'meaning', 'of', 'about', 'tell', 'me', 'please', 'do', 'does', 'you', 'know',
+})
 
 class RAGChatbot:
     def __init__(self, faq_file="faq.json", model_path="best_embedding_model", top_k=5, max_history=10, 
-                 temperature=0.7, top_p=0.9, top_k_gen=40):
+                 temperature=0.7, top_p=0.9, top_k_gen=40, index_path="faq_index",
+                 search_backend="auto", search_params=None, embedding_cache_size=2048, embedding_cache_ttl=None,
+                 answer_cache_size=1000, answer_cache_ttl=24 * 3600, answer_cache_threshold=0.95,
+                 answer_cache_db=None, answer_cache_tags=3, stage_timeouts=None,
+                 max_sessions=1000, session_idle_ttl=3600, language_confidence=0.9,
+                 translation_cache_size=2048, translation_cache_db=None, translation_cache_disk_size=100000,
+                 max_context_tokens=700, max_history_tokens=500, metrics=None, encoder_backend="torch",
+                 retrieval="hybrid", lexical_candidates=100, lexical_margin=2.0, lexical_max_tokens=3,
+                 tag_aggregation="max", tag_oversample=4, extractive_threshold=0.9, extractive_margin=0.1,
+                 small_talk=True, small_talk_threshold=0.85):
         self.top_k = top_k
         self.max_history = max_history
-        self.chat_history = []
+
+        # Instrumentasi latency per stage, counter dan histogram (export JSON / Prometheus)
+        self.metrics = metrics or Metrics()
+        # State per percakapan (chat history) disimpan per session_id, terpisah dari bagian yang di-share
+        # (model embedding, index, client Gemini), sehingga satu instance aman dipakai banyak user
+        self.conversations = ConversationStore(max_history=max_history, max_sessions=max_sessions,
+                                               idle_ttl=session_idle_ttl)
         
         # Parameter untuk Gemini creativity
         self.temperature = temperature
         self.top_p = top_p
         self.top_k_gen = top_k_gen
+
+        # Timeout per stage untuk pipeline async (agenerate_response)
+        self.stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
         
-        # Inisialisasi Gemini model dengan generation config
+        # Prompt builder: context dideduplikasi per tag dan dibatasi budget token
+        self.prompt_builder = PromptBuilder(max_context_tokens=max_context_tokens, max_history_tokens=max_history_tokens)
+
+        # Inisialisasi Gemini model dengan generation config. Instruksi statis dikirim sebagai
+        # system_instruction sehingga menjadi prefix tetap yang bisa di-cache
+        import google.generativeai as genai
+        genai.configure(api_key=gemini_api_key)
         self.gemini_model = genai.GenerativeModel(
             "gemini-1.5-flash-latest",
+            system_instruction=self.prompt_builder.system_instruction,
             generation_config=genai.types.GenerationConfig(
                 temperature=self.temperature,
                 top_p=self.top_p,
@@ -45,153 +95,449 @@ class RAGChatbot:
             )
         )
         
-        # Inisialisasi translator
+        # Inisialisasi translator + cache translasi (LRU in-process dan SQLite opsional)
+        from googletrans import Translator
         self.translator = Translator()
+        self.translation_cache = TranslationCache(memory_size=translation_cache_size, db_path=translation_cache_db,
+                                                  disk_size=translation_cache_disk_size)
         
-        self.system_prompt = """You are a helpful CS (Computer Science) assistant bot. Your role is to help answer questions related to computer science concepts based ONLY on the provided context.
-
-# Notes
-1. Answer in english by default.
-2. Answer ONLY based on the provided context from the knowledge base (you must compare user input with given responses too.
-3. You can respond to greetings (hi, hello, thanks, goodbye) in a friendly way, you can also answer about who you are.
-4. For CS questions NOT covered in the context, politely say you cant recommend the topic from the course.
-6. If the similarity of context quite low, check correctly if there is a misstyping, and ask again. example: user input: abstrction, answer: do you mean ...?, if it is, then enter bla bla...
-7. If the context doesn't contain relevant information for the question, admit you don't know, and ask the question again.
-8. Please explain it further in new paragraph after, relevant to the answer.
-9. If user ask you to tell them more about the relevant context, you're allow to do it with your AI model.
-10. If user ask to recommend topic, pick some topic from here relevant to them (pick 3-5), you can ask them, which one they like most.
-11. If user ask you to make them a quiz (relevant to the topic and the context u get), do it with your AI model and format the choices with good format like the example (enter every choices).
-List of topic: abstraction, error, documentation, testing, datastructure, bst, dynamic, dll, lr, dt, cm, bias, dr, dbms, normal, bcnf, relation, ai, expert, rnn, supervised, hyperparameters, bn, encryption, API, cloud computing, virtual reality, cybersecurity, database, programming, networking, data science, internet of things, blockchain, neural networks, natural language processing, big data, DevOps, computer architecture, digital logic design, javascript, react, oop, data abstraction, objects, classes, and methods, constructors, destructors, operator overloading, generic programming, inheritance, multiple inheritance, polymorphism, aggregation, program debugging and testing, event logging, propositional logic, logical connectives, truth tables, universal quantification, existential quantification, rate of growth of complexity of algorithms, asymptotic notations, time-space trade offs, operations on strings, word processing, pattern matching algorithms, one-dimensional arrays, multi-dimensional arrays, searching algorithms for arrays, sorting algorithms for arrays, matrix multiplication, sparse matrices, stacks, queues, recursion, polish_notation, quick_sort, deques, priority_queues, factorial_calculation, fibonacci_series, adders, decoders, encoders, multiplexers, demultiplexers, binary_code_converters, latches_and_flip_flops, shift_registers, asynchronous_counters, mealy_and_moore_machines, synchronous_counters, state_minimization_techniques, read_only_memory, programmable_array_logic, programmable_logic_array, instruction_set_architecture, accumulator_based, stack_based, register_memory, register_register, instruction_encoding, computer_performance, common_pitfalls, amdahls_law, memory_hierarchy, cache_memory, bus_standards, arbitration_schemes, programmed_io, interrupt_driven_io, direct_memory_access, cap_theorem, distributed_databases, decision_support_systems, data_warehousing, instruction_level_parallelism, pipeline_hazards, data_level_parallelism, branch_prediction, multiple_issue_architectures, software_process_models, requirements_engineering_process, planning_and_scheduling, risk_management, software_quality_assurance, cocomo_model, software_maintenance, osi_reference_model, tcp_ip_reference_model, software_defined_networking, virtual_network_functions, ip_addressing, ip_subnetting, network_routing, computational_intelligence, searching_methodologies, first_order_logic, genetic_algorithms, evolutionary_strategies, kernels, processes, threads, deadlock, scheduling_algorithms, memory_management, secondary_storage_management, file_management, io_management, disk_scheduling, internal_bus_architecture, pin_functions, memory_addressing_schemes, bus_buffering, bus_cycles, clock_generation_circuit, reset_circuit, memory_interfacing, basic_io_interface, programmable_peripheral_interface, programmable_interval_timer, hardware_interrupts, programmable_interrupt_controller, dma_operations, training_vs_testing, theory_of_generalization, vc_dimension, generalization_bounds, bias_variance_tradeoff, stochastic_gradient_descent, backpropagation_algorithm, cs_html_basics, cs_css_basics, cs_http_methods, cs_rest_api, cs_garbage_collection, cs_concurrency_vs_parallelism, cs_solid_principles, cs_compiler_phases, cs_sql_joins, cs_acid_properties, cs_docker_basics, cs_kubernetes_basics, cs_git_basics, cs_agile_methodology, cs_scrum_framework, cs_machine_learning_overview, cs_deep_learning_overview, cs_data_mining, cs_firewall, cs_vpn
-
-Example 1
-Questioner : Hi, I would like to ask about how does machine learning work?
-Assistant : Hi! That's a great question. Machine Learning (ML) is a subset of artificial intelligence (AI) that enables computers to learn from data and improve their performance over time without being explicitly programmed.
-
-Example 2
-Questioner : Hi, how does animal reproduce?
-Assistant : Hi, sorry for the inconvenience, sadly I can't answer your question because it is not related to Computer Science. Thank you for your patience.
-
-Example 3:
-Questioner : Hi, can you recommend me a topic?
-Assistant : Yes, i can recommend you some topic, do you prefer topic 1, topic 2, or maybe topic 3? Feel free to ask!
-
-Example 4:
-Questioner : Hi, can you make me a quiz about (topic 1)?
-Assistant : Yes, i can make a quiz for you! Here's the question: What is the correct choice about error:
-A. ...
-B. ...
-C. ...
-D. ...
-Questioner : The answer is A
-Assitant: Yes, is correct because.../ No, is wrong because..., and the correct answer is... 
-"""
-
-        # Load FAQ embeddings dan model embedding
-        self.faq_data = self._load_json(faq_file)
-        self.embedding_model = SentenceTransformer(model_path)
-        self.embeddings_matrix = np.array([entry['embedding'] for entry in self.faq_data])
+        # Instruksi statis (system_instruction Gemini) dan penyusun prompt dengan budget token
+        self.system_prompt = self.prompt_builder.system_instruction
+
+        # Load knowledge base (index biner memory-mapped) dan model embedding
+        self.kb = self._load_knowledge_base(index_path, faq_file)
+        # encoder_backend: 'torch' (SentenceTransformer) atau 'onnx' / 'onnx-int8' (onnxruntime, tanpa torch)
+        self.embedding_model = load_encoder(model_path, encoder_backend)
+        # Fingerprint model (file + mtime): data turunan seperti course vectors dibangun ulang setelah training ulang
+        self.model_fingerprint = model_fingerprint(model_path)
+        self.embeddings_matrix = self.kb.embeddings
+
+        # Language-ID lokal (script, stop-word, n-gram, istilah CS dari knowledge base) sebelum langdetect.
+        # Vocabulary diambil dari semua tag dan sampel pattern supaya tetap murah untuk KB besar
+        self.language_confidence = language_confidence
+        self.language_identifier = LocalLanguageIdentifier(
+            list(dict.fromkeys(self.kb.tag_names)) + list(self.kb.patterns[:20000])
+        )
+
+        # Backend pencarian: 'exact' (brute-force), 'ivf' (NumPy) atau 'hnsw' (hnswlib).
+        # 'auto' tetap exact untuk corpus kecil seperti data.json
+        self.searcher = load_searcher(self.embeddings_matrix, index_path, search_backend,
+                                      index_id=self.kb.matrix_hash, **(search_params or {}))
+
+        # Retrieval 'hybrid': BM25 (pattern + tag + responses) menghasilkan kandidat, lalu hanya kandidat
+        # itu yang diskor dense dan digabung dengan reciprocal-rank fusion. Query keyword pendek yang
+        # hasil lexical-nya jelas (lexical_margin) tidak di-encode sama sekali. 'dense' = semua baris.
+        self.retrieval = retrieval
+        self.lexical_candidates = lexical_candidates
+        self.lexical_margin = lexical_margin
+        self.lexical_max_tokens = lexical_max_tokens
+        self.lexical_index = BM25Index.from_knowledge_index(self.kb) if retrieval == "hybrid" else None
+
+        # Hasil retrieval per tag (bukan per pattern): tag_oversample x top_k pattern diambil, lalu skor
+        # pattern dalam tag yang sama digabung ('max' atau 'mean'), sehingga setiap topik hanya sekali
+        # masuk prompt. tag_aggregation=None mengembalikan hit per pattern seperti sebelumnya.
+        self.tag_aggregation = tag_aggregation
+        self.tag_oversample = tag_oversample
+
+        # Fast path extractive: hit teratas yang sangat meyakinkan dijawab langsung dengan responses
+        # knowledge base (ditranslate jika perlu) tanpa Gemini. extractive_threshold=None mematikannya
+        self.extractive_threshold = extractive_threshold
+        self.extractive_margin = extractive_margin
+
+        # Router small talk lokal (sapaan, terima kasih, "who are you", ...) di depan pipeline: dijawab dengan
+        # template tanpa deteksi bahasa, translate, search maupun Gemini. Cek embedding (encoder yang sama) hanya
+        # untuk pesan yang seluruhnya kosakata small talk, jadi pertanyaan biasa tidak di-encode dua kali
+        self.small_talk_router = SmallTalkRouter(
+            encode_fn=self._encode_queries, threshold=small_talk_threshold) if small_talk else None
+
+        # Cache embedding query (key: hasil preprocess_text dari query English) agar pertanyaan
+        # yang sering diulang tidak perlu forward pass transformer lagi
+        self.embedding_cache = LRUCache(maxsize=embedding_cache_size, ttl=embedding_cache_ttl)
+
+        # Semantic cache jawaban Gemini: query yang maknanya mirip (>= threshold), dengan top tag context
+        # dan bahasa yang sama, memakai ulang jawaban lama. answer_cache_db untuk persist ke SQLite; entry yang
+        # di-embed dengan model lain (sebelum training ulang) dibuang saat load
+        self.answer_cache_tags = answer_cache_tags
+        self.answer_cache = SemanticCache(threshold=answer_cache_threshold, maxsize=answer_cache_size,
+                                          ttl=answer_cache_ttl, db_path=answer_cache_db,
+                                          model_fingerprint=self.model_fingerprint)
+        self._register_cache_metrics()
+
+    def _register_cache_metrics(self):
+        """Ekspos counter hit/miss dan ukuran setiap cache (serta hit rate fast path extractive) lewat self.metrics"""
+        self.metrics.register_callback('extractive_hit_ratio', self._extractive_hit_ratio)
+        for name, cache in (('embedding', self.embedding_cache), ('answer', self.answer_cache)):
+            self.metrics.register_callback('cache_hits_total', lambda c=cache: c.stats()['hits'], kind='counter', cache=name)
+            self.metrics.register_callback('cache_misses_total', lambda c=cache: c.stats()['misses'], kind='counter', cache=name)
+            self.metrics.register_callback('cache_entries', lambda c=cache: c.stats()['size'], cache=name)
+        translation = self.translation_cache
+        self.metrics.register_callback('cache_hits_total', lambda: translation.stats()['memory_hits'],
+                                       kind='counter', cache='translation_memory')
+        self.metrics.register_callback('cache_hits_total', lambda: translation.stats()['disk_hits'],
+                                       kind='counter', cache='translation_disk')
+        self.metrics.register_callback('cache_misses_total', lambda: translation.stats()['misses'],
+                                       kind='counter', cache='translation')
+        self.metrics.register_callback('cache_entries', lambda: translation.stats()['disk_size'], cache='translation_disk')
 
     def _load_json(self, file_path):
         """Load data JSON dan tangani error jika file tidak ditemukan"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                print(f"Loaded {len(data)} entries from {file_path}")
+                logger.info(f"Loaded {len(data)} entries from {file_path}")
                 return data
         except (FileNotFoundError, json.JSONDecodeError):
-            print(f"Error loading {file_path}.")
+            logger.warning(f"Error loading {file_path}.")
             return []
 
+    def _load_knowledge_base(self, index_path, faq_file):
+        """
+        Load index biner (matrix float32 + metadata sidecar) dengan memory-map.
+        faq.json lama hanya dibaca sebagai fallback, lalu dikompilasi supaya start berikutnya cepat.
+        """
+        if index_path and index_exists(index_path):
+            try:
+                kb = KnowledgeIndex.load(index_path)
+                logger.info(f"Loaded {len(kb)} entries from index {index_path}")
+                return kb
+            except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+                logger.warning(f"Error loading index {index_path}: {e}. Falling back to {faq_file}.")
+
+        kb = KnowledgeIndex.from_faq_entries(self._load_json(faq_file))
+        if index_path and len(kb):
+            try:
+                kb.save(index_path)
+                # Index ANN lama dibangun dari matrix sebelumnya
+                remove_stale_ann(index_path)
+                logger.info(f"Compiled {faq_file} into index {index_path}")
+            except OSError as e:
+                logger.warning(f"Could not write index {index_path}: {e}")
+        return kb
+
     def detect_language(self, text):
-        """Deteksi bahasa dari input text"""
-        try:
-            detected_lang = detect(text)
-            print(f"Detected language: {detected_lang}")
-            return detected_lang
-        except:
-            print("Language detection failed, assuming English")
-            return 'en'
+        """
+        Deteksi bahasa dari input text. Language-ID lokal dipakai lebih dulu; langdetect hanya
+        dipanggil jika hasil lokal kurang yakin (confidence < language_confidence).
+        """
+        with self.metrics.span('detect'):
+            lang, confidence = self.language_identifier.identify(text)
+            if lang is not None and confidence >= self.language_confidence:
+                logger.debug(f"Detected language (local): {lang} ({confidence:.2f})")
+                self.metrics.incr('language_detections_total', method='local')
+                return lang
+
+            try:
+                from langdetect import detect, DetectorFactory
+                DetectorFactory.seed = 0  # langdetect deterministik
+                detected_lang = detect(text)
+                logger.debug(f"Detected language: {detected_lang}")
+                self.metrics.incr('language_detections_total', method='langdetect')
+                return detected_lang
+            except:
+                logger.warning("Language detection failed, assuming English")
+                self.metrics.incr('errors_total', stage='detect')
+                return 'en'
 
     def translate_to_english(self, text, source_lang):
         """Translate text ke bahasa Inggris jika bukan bahasa Inggris"""
         if source_lang == 'en':
             return text
-        
-        try:
-            translated = self.translator.translate(text, src=source_lang, dest='en')
-            print(f"Translated to English: {translated.text}")
-            return translated.text
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return text
+
+        with self.metrics.span('translate_in'):
+            cached = self.translation_cache.get(source_lang, 'en', text)
+            if cached is not None:
+                logger.debug(f"Translated to English (cached): {cached}")
+                return cached
+
+            try:
+                translated = self.translator.translate(text, src=source_lang, dest='en').text
+            except Exception as e:
+                logger.warning(f"Translation error: {e}")
+                self.metrics.incr('errors_total', stage='translate_in')
+                return text
+            logger.debug(f"Translated to English: {translated}")
+            # Di luar try: cache yang gagal ditulis tidak boleh membuang hasil translasi yang berhasil
+            self.translation_cache.put(source_lang, 'en', text, translated)
+            return translated
 
     def translate_from_english(self, text, target_lang):
         """Translate response dari bahasa Inggris ke bahasa target"""
         if target_lang == 'en':
             return text
-            
-        try:
-            translated = self.translator.translate(text, src='en', dest=target_lang)
-            print(f"Translated to {target_lang}: {translated.text}")
-            return translated.text
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return text
+
+        with self.metrics.span('translate_out'):
+            cached = self.translation_cache.get('en', target_lang, text)
+            if cached is not None:
+                logger.debug(f"Translated to {target_lang} (cached): {cached}")
+                return cached
+
+            try:
+                translated = self.translator.translate(text, src='en', dest=target_lang).text
+            except Exception as e:
+                logger.warning(f"Translation error: {e}")
+                self.metrics.incr('errors_total', stage='translate_out')
+                return text
+            logger.debug(f"Translated to {target_lang}: {translated}")
+            self.translation_cache.put('en', target_lang, text, translated)
+            return translated
+
+    def _encode_queries(self, queries):
+        """
+        Encode banyak query sekaligus menjadi embedding float32 yang sudah L2-normalized.
+        Query yang sudah ada di embedding_cache tidak di-encode ulang; sisanya di-encode dalam satu batch.
+        """
+        keys = [preprocess_text(q) for q in queries]
+        vectors = [self.embedding_cache.get(key) for key in keys]
+
+        missing = list(dict.fromkeys(key for key, vec in zip(keys, vectors) if vec is None))
+        if missing:
+            with self.metrics.span('encode'):
+                encoded = np.asarray(self.embedding_model.encode(
+                    missing,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                ), dtype=np.float32)
+            fresh = {}
+            for key, vec in zip(missing, encoded):
+                vec.setflags(write=False)  # vector dibagi antar pemanggil lewat cache
+                fresh[key] = vec
+                self.embedding_cache.put(key, vec)
+            vectors = [vec if vec is not None else fresh[key] for key, vec in zip(keys, vectors)]
+
+        return np.vstack(vectors)
+
+    def encode_texts(self, texts):
+        """
+        Embedding (L2-normalized) dari model yang sama dengan knowledge base, untuk fitur lain di app
+        seperti semantic course search. Query pendek di-cache lewat embedding_cache.
+        """
+        return self._encode_queries(texts)
+
+    def _row_k(self, k):
+        """Jumlah pattern yang diambil supaya setelah digabung per tag tetap ada k tag"""
+        return k * self.tag_oversample if self.tag_aggregation else k
+
+    def _build_contexts(self, indices, scores, k, retrieval='dense'):
+        """
+        Ubah hasil retrieval per baris (urut dari yang terbaik) menjadi list context untuk _format_context.
+        Dengan tag_aggregation, satu context per tag: pattern terbaiknya, skor gabungan dan jumlah hits.
+        """
+        if not self.tag_aggregation:
+            return [{
+                'tag': self.kb.tag(idx),
+                'pattern': self.kb.patterns[idx],
+                'responses': self.kb.tag_responses[self.kb.tag_ids[idx]],
+                'similarity': float(score),
+                'row': int(idx),
+                'hits': 1,
+                'retrieval': retrieval,
+            } for idx, score in list(zip(indices, scores))[:k] if idx >= 0]
+
+        tag_ids, tag_scores, best_rows, hits = self.kb.aggregate_tags(indices, scores, k, self.tag_aggregation)
+        return [{
+            'tag': self.kb.tag_names[tag_id],
+            'pattern': self.kb.patterns[row],
+            'responses': self.kb.tag_responses[tag_id],
+            'similarity': float(score),
+            'row': int(row),
+            'hits': int(count),
+            'retrieval': retrieval,
+        } for tag_id, score, row, count in zip(tag_ids, tag_scores, best_rows, hits)]
+
+    def _lexical_confident(self, query, rows, scores, matched):
+        """
+        Hasil BM25 cukup jelas untuk melewati encoder: query pendek, semua token dikenal index,
+        dan skor tag teratas unggul >= lexical_margin kali atas tag lain
+        """
+        if not len(rows) or matched < 1.0 or len(lexical_tokens(query)) > self.lexical_max_tokens:
+            return False
+        tag_ids = self.kb.tag_ids[rows]
+        runner_up = next((score for tag_id, score in zip(tag_ids, scores) if tag_id != tag_ids[0]), 0.0)
+        return runner_up <= 0 or scores[0] >= self.lexical_margin * runner_up
+
+    def _lexical_contexts(self, rows, k):
+        """
+        Context dari hasil BM25 tanpa meng-encode query. Similarity diisi cosine antara pattern teratas
+        dan setiap baris (pattern teratas = 1.0), supaya tetap sebanding dengan skor dense.
+        """
+        rows = rows[:self._row_k(k)]
+        anchor = np.asarray(self.kb.embeddings[rows[0]], dtype=np.float32)
+        similarities = np.asarray(self.kb.embeddings[rows], dtype=np.float32) @ anchor
+        return self._build_contexts(rows, similarities, k, retrieval='lexical')
+
+    def _hybrid_contexts(self, query_embedding, lexical_rows, k):
+        """
+        Dense rerank atas kandidat BM25 lalu reciprocal-rank fusion. Jika kandidat lexical terlalu sedikit
+        (mis. parafrase tanpa kata yang sama), kandidat dense diambil dari searcher biasa.
+        """
+        row_k = self._row_k(k)
+        if len(lexical_rows) >= max(2 * row_k, 20):
+            candidates = np.sort(lexical_rows)
+            dense_scores = np.asarray(self.kb.embeddings[candidates], dtype=np.float32) @ query_embedding
+            order = np.argsort(-dense_scores, kind='stable')
+            dense_rows, dense_scores = candidates[order], dense_scores[order]
+        else:
+            indices, scores = self.searcher.search(query_embedding, max(row_k, self.lexical_candidates))
+            keep = indices[0] >= 0
+            dense_rows, dense_scores = indices[0][keep], scores[0][keep]
+
+        ranked, _ = reciprocal_rank_fusion([dense_rows.tolist(), lexical_rows.tolist()])
+        dense_lookup = dict(zip(dense_rows.tolist(), dense_scores.tolist()))
+        top = ranked[:row_k]
+        # Baris yang hanya ditemukan BM25 diskor dense langsung supaya similarity selalu cosine
+        missing = [row for row in top if row not in dense_lookup]
+        if missing:
+            extra = np.asarray(self.kb.embeddings[np.array(missing)], dtype=np.float32) @ query_embedding
+            dense_lookup.update(zip(missing, extra.tolist()))
+        return self._build_contexts(top, [dense_lookup[row] for row in top], k, retrieval='hybrid')
+
+    def search_batch(self, queries, k=None):
+        """
+        Semantic search untuk banyak query sekaligus (mis. evaluasi offline atau bulk answering).
+        Semua query di-encode dalam satu batch dan diskor dengan satu matmul.
+        Mengembalikan list context per query, dengan urutan sama seperti input.
+        """
+        k = k or self.top_k
+        if not queries or not len(self.kb):
+            return [[] for _ in queries]
+
+        if self.lexical_index is None:
+            query_embeddings = self._encode_queries(queries)
+            with self.metrics.span('search'):
+                indices, scores = self.searcher.search(query_embeddings, self._row_k(k))
+            self.metrics.incr('retrieval_total', len(queries), path='dense')
+            return [self._build_contexts(idx_row, score_row, k) for idx_row, score_row in zip(indices, scores)]
+
+        # Tahap 1: kandidat BM25; query yang hasil lexical-nya jelas langsung dijawab tanpa encoder
+        results = [None] * len(queries)
+        lexical = []
+        with self.metrics.span('lexical_search'):
+            for i, query in enumerate(queries):
+                rows, scores, matched = self.lexical_index.search(query, self.lexical_candidates)
+                lexical.append(rows)
+                if self._lexical_confident(query, rows, scores, matched):
+                    results[i] = self._lexical_contexts(rows, k)
+                    self.metrics.incr('retrieval_total', path='lexical')
+
+        # Tahap 2: encode hanya query sisanya (satu batch), dense rerank kandidat + RRF
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            query_embeddings = self._encode_queries([queries[i] for i in pending])
+            with self.metrics.span('search'):
+                for i, query_embedding in zip(pending, query_embeddings):
+                    results[i] = self._hybrid_contexts(query_embedding, lexical[i], k)
+            self.metrics.incr('retrieval_total', len(pending), path='hybrid')
+        return results
 
     def _search_context(self, query):
         """
         Mencari context relevan untuk query user menggunakan cosine similarity.
-        Mengembalikan list context dengan skor similarity.
+        Matrix sudah L2-normalized saat load, jadi cukup dot product + argpartition top-k.
+        Mengembalikan list context (satu per tag, lihat tag_aggregation) dengan skor similarity.
         """
-        query_embedding = self.embedding_model.encode([preprocess_text(query)])
-        similarities = cosine_similarity(query_embedding, self.embeddings_matrix)[0]
-        top_indices = np.argsort(similarities)[-self.top_k:][::-1]
+        return self.search_batch([query], self.top_k)[0]
 
-        return [{
-            'tag': self.faq_data[idx]['tag'],
-            'pattern': self.faq_data[idx]['original_pattern'],
-            'responses': self.faq_data[idx]['responses'],
-            'similarity': similarities[idx]
-        } for idx in top_indices]
-
-    def _format_context(self, contexts):
-        """Format context yang relevan untuk dimasukkan ke prompt Gemini"""
-        if not contexts:
-            return "No relevant context found."
-
-        lines = ["KNOWLEDGE BASE CONTEXT:"]
-        for i, ctx in enumerate(contexts, 1):
-            lines.append(
-                f"\n{i}. Topic: {ctx['tag']}\n"
-                f"   Question Pattern: {ctx['pattern']}\n"
-                f"   Responses: {'; '.join(ctx['responses'])}\n"
-                f"   Relevance Score: {ctx['similarity']:.4f}"
-            )
-        return '\n'.join(lines)
+    def _format_context(self, contexts, query=""):
+        """Format context yang relevan untuk dimasukkan ke prompt Gemini (dedup per tag, dalam budget token)"""
+        return self.prompt_builder.format_context(contexts, query)
 
-    def _format_history(self):
+    @property
+    def chat_history(self):
+        """Chat history session default (kompatibel dengan pemakaian lama di CLI / notebook)"""
+        return self.conversations.get(DEFAULT_SESSION)
+
+    def _format_history(self, history):
         """Format chat history untuk konteks prompt"""
-        if not self.chat_history:
-            return ""
-        return "\nCHAT HISTORY:\n" + '\n\n'.join(
-            f"User: {h['user']}\nAssistant: {h['assistant']}"
-            for h in self.chat_history[-self.max_history:]
-        )
+        return self.prompt_builder.format_history(history[-self.max_history:])
 
-    def _update_history(self, user, assistant):
-        """Tambahkan percakapan ke history dan batasi ke max_history"""
-        self.chat_history.append({'user': user, 'assistant': assistant})
-        if len(self.chat_history) > self.max_history:
-            self.chat_history = self.chat_history[-self.max_history:]
+    def _update_history(self, user, assistant, session_id=DEFAULT_SESSION):
+        """Tambahkan percakapan ke history session (dibatasi ke max_history oleh ConversationStore)"""
+        self.conversations.append(session_id, user, assistant)
 
-    def generate_response(self, user_query):
+    def _answer_cache_key(self, english_query, contexts, detected_lang, history):
         """
-        Fungsi utama untuk menghasilkan respon dengan multilingual support:
+        Key untuk semantic answer cache: (embedding query, top context tags, bahasa).
+        Mengembalikan None (cache dilewati) jika sudah ada chat history, karena jawabannya
+        bisa bergantung pada percakapan sebelumnya.
+        """
+        if self.answer_cache.maxsize <= 0 or not contexts or history:
+            return None
+        tags = [ctx['tag'] for ctx in contexts[:self.answer_cache_tags]]
+        if contexts[0].get('retrieval') == 'lexical':
+            # Query keyword yang dijawab lewat BM25 tidak di-encode: key exact dari token query
+            # (embedding None), bukan embedding pattern KB yang sama untuk semua query di baris itu
+            signature = ' '.join(sorted(set(lexical_tokens(english_query))))
+            return None, tags + [f"lexical:{signature}"], detected_lang
+        return self._encode_queries([english_query])[0], tags, detected_lang
+
+    def _extractive_hit_ratio(self):
+        hits = self.metrics.value('extractive_total', result='hit')
+        checks = hits + self.metrics.value('extractive_total', result='miss')
+        return hits / checks if checks else 0.0
+
+    def _extractive_answer(self, english_query, contexts):
+        """
+        Jawaban langsung dari responses knowledge base jika hit teratas sangat meyakinkan:
+        - dense / hybrid: similarity >= extractive_threshold dan unggul >= extractive_margin atas tag berikutnya
+        - lexical (query tidak di-encode, similarity bukan cosine query): token query sama persis dengan token
+          pattern teratas (mis. "data abstraction" untuk "What is data abstraction?") atau dengan nama tag
+          teratas (mis. "bcnf"); sebagian kata tag saja (mis. "sql" untuk cs_sql_joins) tidak cukup.
+          Margin tag sudah dicek oleh _lexical_confident
+        Mengembalikan teks response (English) atau None.
+        """
+        if self.extractive_threshold is None or not contexts:
+            return None
+        top = contexts[0]
+        if top.get('retrieval') == 'lexical':
+            tokens = set(lexical_tokens(english_query, EXTRACTIVE_FILLER_WORDS))
+            pattern_tokens = set(lexical_tokens(top['pattern'], EXTRACTIVE_FILLER_WORDS))
+            tag_tokens = set(lexical_tokens(top['tag'].replace('_', ' '), EXTRACTIVE_FILLER_WORDS))
+            confident = bool(tokens) and (tokens == pattern_tokens or tokens == tag_tokens)
+        else:
+            runner_up = next((ctx['similarity'] for ctx in contexts[1:] if ctx['tag'] != top['tag']), 0.0)
+            confident = (top['similarity'] >= self.extractive_threshold
+                         and top['similarity'] - runner_up >= self.extractive_margin)
+        self.metrics.incr('extractive_total', result='hit' if confident else 'miss')
+        return "\n\n".join(top['responses']) if confident and top['responses'] else None
+
+    def _precomputed_response(self, prepared):
+        """Jawaban yang tidak butuh Gemini: (teks, source) dari fast path extractive atau semantic cache"""
+        if prepared.get('extractive_response') is not None:
+            return prepared['extractive_response'], 'extractive'
+        if prepared['cached_response'] is not None:
+            return prepared['cached_response'], 'cache'
+        return None, None
+
+    def _small_talk_response(self, user_query, session_id=DEFAULT_SESSION):
+        """
+        Jawab small talk langsung dari template router. Template yang belum ada dalam bahasa user
+        ditranslate dari versi English. Mengembalikan (reply, lang) atau None untuk pesan biasa.
+        Konfirmasi seperti "ok" di tengah percakapan diteruskan ke pipeline (bisa menjawab pertanyaan bot).
+        """
+        if self.small_talk_router is None:
+            return None
+        with self.metrics.span('route'):
+            routed = self.small_talk_router.route(user_query, in_conversation=bool(self.conversations.get(session_id)))
+        if routed is None:
+            return None
+
+        intent, lang, _ = routed
+        reply = self.small_talk_router.reply(intent, lang)
+        if reply is None:
+            reply = self.translate_from_english(self.small_talk_router.reply(intent, 'en'), lang)
+        self.metrics.incr('small_talk_total', intent=intent)
+        self.metrics.incr('requests_total', source='small_talk')
+        self._update_history(user_query, reply, session_id)
+        return reply, lang
+
+    def _prepare_response(self, user_query, session_id=DEFAULT_SESSION):
+        """
+        Tahap sebelum memanggil Gemini (dipakai bersama oleh generate_response dan generate_response_stream):
         1. Deteksi bahasa input
         2. Translate ke English jika perlu
         3. Semantic search
-        4. Generate response dengan Gemini
-        5. Translate response kembali ke bahasa input
+        4. Fast path extractive, lalu semantic answer cache; jika keduanya miss susun prompt
+        Mengembalikan dict berisi detected_lang, contexts, cache_key, cached_response, extractive_response dan prompt.
         """
         # Step 1: Deteksi bahasa input
         detected_lang = self.detect_language(user_query)
@@ -200,40 +546,255 @@ Assitant: Yes, is correct because.../ No, is wrong because..., and the correct a
         english_query = self.translate_to_english(user_query, detected_lang)
         
         # Step 3: Semantic search dengan query English
-        print(f"Mencari context relevan (top-{self.top_k})...")
+        logger.debug(f"Mencari context relevan (top-{self.top_k})...")
         contexts = self._search_context(english_query)
-        
-        # Step 4: Format prompt dengan instruksi bahasa
-        lang_instruction = f"IMPORTANT: Respond ONLY in the same language as this original user question: '{user_query}'. Do not provide multiple language versions or translations."
-        
-        prompt = f"""{self.system_prompt}
 
-{self._format_context(contexts)}
+        history = self.conversations.get(session_id)
+        return self._prepare_from_contexts(user_query, english_query, contexts, detected_lang, session_id, history)
+
+    def _prepare_from_contexts(self, user_query, english_query, contexts, detected_lang, session_id, history,
+                               history_text=None):
+        """Cek fast path extractive dan semantic answer cache untuk hasil retrieval, jika miss susun prompt Gemini"""
+        prepared = {
+            'session_id': session_id,
+            'detected_lang': detected_lang,
+            'contexts': contexts,
+            'cache_key': None,
+            'cached_response': None,
+            'extractive_response': None,
+            'prompt': None,
+            'prompt_tokens': None,
+        }
+
+        # Fast path: pertanyaan yang hampir sama persis dengan pattern dijawab dengan responses yang sudah dikurasi
+        extractive = self._extractive_answer(english_query, contexts)
+        if extractive is not None:
+            if detected_lang != 'en':
+                extractive = self.translate_from_english(extractive, detected_lang)
+            contexts[0]['extractive'] = True  # penanda untuk UI
+            prepared['extractive_response'] = extractive
+            return prepared
+
+        prepared['cache_key'] = self._answer_cache_key(english_query, contexts, detected_lang, history)
+
+        # Semantic answer cache: pakai ulang jawaban untuk pertanyaan yang maknanya sama
+        if prepared['cache_key'] is not None:
+            prepared['cached_response'] = self.answer_cache.lookup(*prepared['cache_key'])
+            if prepared['cached_response'] is not None:
+                logger.debug("Answer found in semantic cache")
+                return prepared
+
+        if history_text is None:
+            history_text = self._format_history(history)
+        with self.metrics.span('prompt_build'):
+            prepared['prompt'], prepared['prompt_tokens'] = self._build_prompt(user_query, english_query, contexts, history_text)
+        self.metrics.observe('prompt_tokens', prepared['prompt_tokens']['total'])
+        logger.debug(f"Prompt tokens (estimated): {prepared['prompt_tokens']}")
+        return prepared
+
+    def _build_prompt(self, user_query, english_query, contexts, history_text):
+        """
+        Format prompt Gemini dengan context, history dan instruksi bahasa.
+        Instruksi statis tidak ikut di sini karena sudah menjadi system_instruction.
+        Mengembalikan (prompt, laporan jumlah token per bagian).
+        """
+        return self.prompt_builder.build(user_query, english_query, contexts, history_text)
+
+    def _finish_response(self, user_query, bot_response, prepared):
+        """Simpan jawaban final ke semantic cache (jika baru) dan ke chat history"""
+        if prepared['cache_key'] is not None and prepared['cached_response'] is None:
+            self.answer_cache.store(*prepared['cache_key'], bot_response)
+        # Update history dengan bahasa asli user
+        self._update_history(user_query, bot_response, prepared['session_id'])
+
+    def _record_response(self, bot_response, source):
+        self.metrics.incr('requests_total', source=source)
+        self.metrics.observe('response_chars', len(bot_response))
+
+    def _error_message(self, error, detected_lang):
+        """Pesan error untuk user, ditranslate ke bahasa user jika perlu"""
+        error_msg = f"Maaf, terjadi error: {str(error)}"
+        if detected_lang != 'en':
+            error_msg = self.translate_from_english("Sorry, an error occurred: " + str(error), detected_lang)
+        return error_msg
+
+    def generate_response(self, user_query, session_id=DEFAULT_SESSION):
+        """
+        Fungsi utama untuk menghasilkan respon dengan multilingual support:
+        0. Small talk (sapaan, terima kasih, ...) langsung dijawab router lokal
+        1. Deteksi bahasa input
+        2. Translate ke English jika perlu
+        3. Semantic search
+        4. Generate response dengan Gemini
+        5. Translate response kembali ke bahasa input
+        session_id memilih chat history yang dipakai, supaya banyak user bisa berbagi satu instance.
+        """
+        with self.metrics.span('request'):
+            small_talk = self._small_talk_response(user_query, session_id)
+            if small_talk is not None:
+                return small_talk[0], [], small_talk[1]
+
+            prepared = self._prepare_response(user_query, session_id)
+            contexts, detected_lang = prepared['contexts'], prepared['detected_lang']
+
+            answer, source = self._precomputed_response(prepared)
+            if answer is not None:
+                self._finish_response(user_query, answer, prepared)
+                self.metrics.incr('requests_total', source=source)
+                return answer, contexts, detected_lang
+
+            try:
+                logger.debug("CS Helper bot is answering...")
+                with self.metrics.span('generate'):
+                    response = self.gemini_model.generate_content(prepared['prompt'])
+                bot_response = response.text.strip()
+                self._finish_response(user_query, bot_response, prepared)
+                self._record_response(bot_response, 'llm')
+                return bot_response, contexts, detected_lang
+
+            except Exception as e:
+                self.metrics.incr('requests_total', source='error')
+                return self._error_message(e, detected_lang), contexts, detected_lang
+
+    def generate_response_stream(self, user_query, session_id=DEFAULT_SESSION):
+        """
+        Versi streaming dari generate_response. Mengembalikan (chunks, contexts, detected_lang),
+        dengan chunks berupa generator teks yang di-yield begitu potongan jawaban Gemini tiba
+        (bisa langsung dipakai st.write_stream). History dan cache baru diupdate setelah stream selesai.
+        """
+        small_talk = self._small_talk_response(user_query, session_id)
+        if small_talk is not None:
+            return iter([small_talk[0]]), [], small_talk[1]
+
+        prepared = self._prepare_response(user_query, session_id)
+        return self._stream_chunks(user_query, prepared), prepared['contexts'], prepared['detected_lang']
+
+    def _stream_chunks(self, user_query, prepared):
+        answer, source = self._precomputed_response(prepared)
+        if answer is not None:
+            yield answer
+            self._finish_response(user_query, answer, prepared)
+            self.metrics.incr('requests_total', source=source)
+            return
+
+        parts = []
+        start = time.perf_counter()
+        try:
+            logger.debug("CS Helper bot is answering (streaming)...")
+            for chunk in self.gemini_model.generate_content(prepared['prompt'], stream=True):
+                text = chunk.text
+                if not parts:
+                    # Spasi di awal jawaban di-strip seperti pada generate_response
+                    text = text.lstrip()
+                if text:
+                    if not parts:
+                        self.metrics.observe('first_token_seconds', time.perf_counter() - start, buckets=LATENCY_BUCKETS)
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            self.metrics.incr('errors_total', stage='generate')
+            self.metrics.incr('requests_total', source='error')
+            yield ("\n\n" if parts else "") + self._error_message(e, prepared['detected_lang'])
+            return
+        finally:
+            self.metrics.observe('stage_seconds', time.perf_counter() - start, buckets=LATENCY_BUCKETS, stage='generate')
 
-{self._format_history()}
+        bot_response = ''.join(parts).strip()
+        if bot_response:
+            self._finish_response(user_query, bot_response, prepared)
+            self._record_response(bot_response, 'llm')
 
-{lang_instruction}
+    async def _run_stage(self, stage, func, *args, fallback=None):
+        """
+        Jalankan stage blocking di thread pool (asyncio.to_thread) dengan timeout per stage.
+        Jika timeout atau error, kembalikan fallback supaya pipeline tetap jalan.
+        """
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(func, *args), self.stage_timeouts.get(stage))
+        except asyncio.TimeoutError:
+            logger.warning(f"Stage '{stage}' timed out after {self.stage_timeouts.get(stage)}s")
+            self.metrics.incr('timeouts_total', stage=stage)
+        except Exception as e:
+            logger.warning(f"Stage '{stage}' failed: {e}")
+            self.metrics.incr('errors_total', stage=stage)
+        return fallback
 
-Current User Question: {user_query}
-"""
+    async def agenerate_response(self, user_query, session_id=DEFAULT_SESSION):
+        """
+        Versi async dari generate_response, untuk melayani banyak chat bersamaan dalam satu event loop:
+        - Embedding query mentah dihitung secara spekulatif selama deteksi bahasa/translate berjalan
+          (untuk query English, hasilnya langsung dipakai lewat embedding_cache)
+        - Skeleton prompt (chat history) disiapkan selagi semantic search berjalan
+        - Gemini dipanggil dengan client async, tanpa memblokir thread
+        Setiap stage punya timeout (stage_timeouts). Mengembalikan (bot_response, contexts, detected_lang).
+        """
+        small_talk = await self._run_stage('route', self._small_talk_response, user_query, session_id)
+        if small_talk is not None:
+            return small_talk[0], [], small_talk[1]
 
+        speculative_encode = asyncio.create_task(
+            self._run_stage('encode', self._encode_queries, [user_query])
+        )
+
+        # Step 1 & 2: Deteksi bahasa dan translate ke English
+        detected_lang = await self._run_stage('detect', self.detect_language, user_query, fallback='en')
+        english_query = user_query
+        if detected_lang != 'en':
+            english_query = await self._run_stage(
+                'translate', self.translate_to_english, user_query, detected_lang, fallback=user_query
+            )
+
+        # Tunggu embedding spekulatif supaya search tidak meng-encode query yang sama dua kali
+        if preprocess_text(english_query) == preprocess_text(user_query):
+            await speculative_encode
+
+        # Step 3: Semantic search, sambil menyiapkan history untuk prompt
+        logger.debug(f"Mencari context relevan (top-{self.top_k})...")
+        search = asyncio.create_task(
+            self._run_stage('search', self._search_context, english_query, fallback=[])
+        )
+        history = self.conversations.get(session_id)
+        history_text = self._format_history(history)
+        contexts = await search
+
+        prepared = await self._run_stage(
+            'prepare', self._prepare_from_contexts, user_query, english_query, contexts, detected_lang,
+            session_id, history, history_text
+        )
+        if prepared is None:
+            prompt, prompt_tokens = self._build_prompt(user_query, english_query, contexts, history_text)
+            prepared = {'session_id': session_id, 'detected_lang': detected_lang, 'contexts': contexts, 'cache_key': None,
+                        'cached_response': None, 'extractive_response': None, 'prompt': prompt,
+                        'prompt_tokens': prompt_tokens}
+
+        answer, source = self._precomputed_response(prepared)
+        if answer is not None:
+            self._finish_response(user_query, answer, prepared)
+            self.metrics.incr('requests_total', source=source)
+            return answer, contexts, detected_lang
+
+        # Step 4: Generate response dengan Gemini (async client)
         try:
-            print("CS Helper bot is answering...")
-            response = self.gemini_model.generate_content(prompt)
+            logger.debug("CS Helper bot is answering...")
+            with self.metrics.span('generate'):
+                response = await asyncio.wait_for(
+                    self.gemini_model.generate_content_async(prepared['prompt']),
+                    self.stage_timeouts.get('generate'),
+                )
             bot_response = response.text.strip()
-            
-            # Update history dengan bahasa asli user
-            self._update_history(user_query, bot_response)
+            self._finish_response(user_query, bot_response, prepared)
+            self._record_response(bot_response, 'llm')
             return bot_response, contexts, detected_lang
-            
+        except asyncio.TimeoutError:
+            self.metrics.incr('timeouts_total', stage='generate')
+            self.metrics.incr('requests_total', source='error')
+            error = TimeoutError(f"Gemini did not answer within {self.stage_timeouts.get('generate')}s")
+            return await asyncio.to_thread(self._error_message, error, detected_lang), contexts, detected_lang
         except Exception as e:
-            error_msg = f"Maaf, terjadi error: {str(e)}"
-            # Translate error message ke bahasa user jika perlu
-            if detected_lang != 'en':
-                error_msg = self.translate_from_english("Sorry, an error occurred: " + str(e), detected_lang)
-            return error_msg, contexts, detected_lang
+            self.metrics.incr('requests_total', source='error')
+            return await asyncio.to_thread(self._error_message, e, detected_lang), contexts, detected_lang
 
-    def chat(self, user_query):
+    def chat(self, user_query, session_id=DEFAULT_SESSION):
         """
         Fungsi interaktif chatbot dengan multilingual support:
         - Terima pertanyaan user dalam bahasa apapun
@@ -241,7 +802,7 @@ Current User Question: {user_query}
         - Cetak hasil dan context yang ditemukan
         """
         print(f"\nUser: {user_query}")
-        bot_response, contexts, detected_lang = self.generate_response(user_query)
+        bot_response, contexts, detected_lang = self.generate_response(user_query, session_id)
         print(f"Bot: {bot_response}")
 
         # Debug: tampilkan context yang ditemukan
@@ -253,23 +814,25 @@ Current User Question: {user_query}
         return bot_response
 
     # Fungsi untuk clear chat history
-    def clear_history(self):
-        self.chat_history = []
+    def clear_history(self, session_id=DEFAULT_SESSION):
+        self.conversations.clear(session_id)
         print("Chat history sudah dihapus.")
 
     # Fungsi untuk melihat seluruh chat history
-    def show_history(self):
-        if not self.chat_history:
+    def show_history(self, session_id=DEFAULT_SESSION):
+        history = self.conversations.get(session_id)
+        if not history:
             print("Belum ada chat history.")
             return
         print("\n=== CHAT HISTORY ===")
-        for i, h in enumerate(self.chat_history, 1):
+        for i, h in enumerate(history, 1):
             print(f"{i}. User: {h['user']}")
             print(f"   Bot: {h['assistant']}\n")
 
     # Fungsi untuk melihat bahasa yang didukung
     def show_supported_languages(self):
         """Menampilkan daftar bahasa yang didukung oleh Google Translate"""
+        from googletrans import LANGUAGES
         print("\n=== SUPPORTED LANGUAGES ===")
         for code, name in LANGUAGES.items():
             print(f"{code}: {name}")
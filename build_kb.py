@@ -0,0 +1,163 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from ann_index import ANN_FILE_SUFFIX, ann_path
+from encoders import ONNX_DIR
+from kb_index import KnowledgeIndex, build_tag_table, index_exists, normalize_rows, preprocess_text
+
+# Naikkan jika cara teks pattern disiapkan sebelum di-encode berubah (memaksa full rebuild)
+TEXT_PIPELINE_VERSION = 1
+
+
+def entry_hash(tag, pattern):
+    """Content hash satu pasangan (tag, pattern)"""
+    return hashlib.sha256(f"{tag}\x00{pattern}".encode('utf-8')).hexdigest()
+
+
+def model_fingerprint(model_path):
+    """Fingerprint folder model (nama file, ukuran, mtime): model yang dilatih ulang membuat semua embedding basi"""
+    digest = hashlib.sha256()
+    if os.path.isdir(model_path):
+        for root, dirs, files in os.walk(model_path):
+            dirs[:] = sorted(d for d in dirs if d != ONNX_DIR)  # export ONNX tidak mengubah bobot model
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, model_path)}\x00{stat.st_size}\x00{stat.st_mtime_ns}\n".encode('utf-8'))
+    else:
+        digest.update(model_path.encode('utf-8'))  # nama model Hugging Face Hub
+    return digest.hexdigest()
+
+
+def load_intents(data_file):
+    """Baca data.json (format {'intents': [{'tag', 'patterns', 'responses'}]}) menjadi list entry datar"""
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    entries, seen = [], set()
+    for intent in data.get('intents', []):
+        for pattern in intent.get('patterns', []):
+            key = entry_hash(intent['tag'], pattern)
+            if key in seen:  # pattern duplikat dalam tag yang sama cukup satu baris
+                continue
+            seen.add(key)
+            entries.append({
+                'tag': intent['tag'],
+                'pattern': pattern,
+                'responses': list(intent.get('responses', [])),
+                'hash': key,
+            })
+    return entries
+
+
+def encode_texts(model, texts, batch_size=256, workers=1):
+    """Encode dalam batch besar; workers > 1 memakai multi-process pool SentenceTransformer"""
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    if workers > 1 and len(texts) >= workers * batch_size:
+        pool = model.start_multi_process_pool(target_devices=['cpu'] * workers)
+        try:
+            embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=len(texts) > batch_size)
+    return normalize_rows(embeddings)
+
+
+def build_index(entries, model_path, previous=None, encode_fn=None):
+    """
+    Susun KnowledgeIndex baru dari entries. Embedding baris yang content hash-nya sudah ada di index
+    sebelumnya (dengan model dan pipeline teks yang sama) dipakai ulang; hanya pattern baru / berubah
+    yang di-encode. Entry yang dihapus dari data.json otomatis hilang.
+    Mengembalikan (index, stats).
+    """
+    build = {
+        'model': model_fingerprint(model_path),
+        'text_pipeline': TEXT_PIPELINE_VERSION,
+    }
+
+    reusable = {}
+    if previous is not None and previous.build == build and len(previous):
+        for row, (tag_id, pattern) in enumerate(zip(previous.tag_ids, previous.patterns)):
+            reusable[entry_hash(previous.tag_names[tag_id], pattern)] = row
+
+    missing = [entry for entry in entries if entry['hash'] not in reusable]
+    encoded = encode_fn([preprocess_text(entry['pattern']) for entry in missing]) if missing else None
+    fresh = {entry['hash']: vector for entry, vector in zip(missing, encoded)} if missing else {}
+
+    tag_ids, tag_names, tag_responses = build_tag_table((entry['tag'], entry['responses']) for entry in entries)
+    patterns = [entry['pattern'] for entry in entries]
+    vectors = []
+    for entry in entries:
+        row = reusable.get(entry['hash'])
+        vectors.append(previous.embeddings[row] if row is not None else fresh[entry['hash']])
+
+    embeddings = normalize_rows(np.vstack(vectors)) if vectors else np.zeros((0, 0), dtype=np.float32)
+    current = {entry['hash'] for entry in entries}
+    stats = {
+        'total': len(entries),
+        'tags': len(tag_names),
+        'reused': len(entries) - len(missing),
+        'encoded': len(missing),
+        'removed': len(set(reusable) - current),
+        'unchanged': (previous is not None and not missing and previous.build == build
+                      and np.array_equal(previous.tag_ids, tag_ids) and previous.patterns == patterns
+                      and previous.tag_names == tag_names and previous.tag_responses == tag_responses),
+    }
+    return KnowledgeIndex(embeddings, tag_ids, patterns, tag_names, tag_responses, build=build), stats
+
+
+def remove_stale_ann(index_path):
+    """Index ANN dibangun untuk baris lama; hapus supaya dibangun ulang saat chatbot start"""
+    for backend in ANN_FILE_SUFFIX:
+        path = ann_path(index_path, backend)
+        for stale in (path, path + '.meta.json'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally build the knowledge base index from data.json")
+    parser.add_argument("data_file", nargs="?", default="data.json")
+    parser.add_argument("index_path", nargs="?", default="faq_index")
+    parser.add_argument("--model", default="best_embedding_model", help="SentenceTransformer model path")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1, help="encode processes for large rebuilds")
+    parser.add_argument("--full", action="store_true", help="ignore the existing index and re-encode everything")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    entries = load_intents(args.data_file)
+    previous = None
+    if not args.full and index_exists(args.index_path):
+        try:
+            previous = KnowledgeIndex.load(args.index_path)
+        except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+            print(f"Existing index {args.index_path} unreadable ({e}), rebuilding from scratch")
+
+    model = None
+
+    def encode_fn(texts):
+        global model
+        if model is None:
+            # Model hanya di-load jika memang ada pattern yang perlu di-encode
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(args.model)
+        return encode_texts(model, texts, batch_size=args.batch_size, workers=args.workers)
+
+    index, stats = build_index(entries, args.model, previous=previous, encode_fn=encode_fn)
+    if stats['unchanged']:
+        print(f"{args.index_path} is up to date ({stats['total']} entries)")
+        raise SystemExit(0)
+
+    index.save(args.index_path)
+    # Urutan baris bisa berubah, jadi index ANN lama tidak lagi valid
+    remove_stale_ann(args.index_path)
+    print(f"Built {stats['total']} entries ({stats['tags']} tags) into {args.index_path} in {time.perf_counter() - start:.1f}s "
+          f"(reused {stats['reused']}, encoded {stats['encoded']}, removed {stats['removed']})")
@@ -0,0 +1,364 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Cache LRU thread-safe dengan batas jumlah entry dan TTL opsional (detik).
+    Menyimpan counter hit/miss supaya efektivitas cache bisa dipantau.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Ambil value dan tandai sebagai baru dipakai; entry yang kadaluarsa dianggap miss"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Simpan value; entry paling lama tidak dipakai dibuang jika melebihi maxsize"""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            return item is not _MISSING and (item[1] is None or item[1] > time.monotonic())
+
+    def stats(self):
+        """Ringkasan counter cache: hits, misses, hit_rate, size, maxsize"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+class SemanticCache:
+    """
+    Cache jawaban LLM berdasarkan kemiripan makna query.
+    Sebuah query dianggap sama jika cosine similarity embedding-nya >= threshold terhadap query yang
+    sudah di-cache, DAN top context tag serta bahasanya identik. Entry dibatasi maxsize (LRU) dan ttl,
+    dan bisa dipersist ke SQLite (db_path) supaya tetap ada setelah restart.
+    Embedding None berarti key exact: hanya cocok dengan entry tanpa embedding dengan tags dan bahasa sama.
+    Setiap baris SQLite mencatat model_fingerprint; embedding dari model lain (sebelum training ulang)
+    tidak sebanding sehingga dihapus saat load.
+    """
+
+    def __init__(self, threshold=0.95, maxsize=1000, ttl=None, db_path=None, model_fingerprint=None):
+        self.threshold = threshold
+        self.model_fingerprint = model_fingerprint
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # entry_id -> (group_key, created_at)
+        self._groups = {}  # (tags, lang) -> {entry_id: (embedding, answer)}
+        self._next_local_id = -1  # id entry yang tidak (berhasil) dipersist; id dari SQLite selalu positif
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, tags TEXT, lang TEXT, embedding BLOB, answer TEXT, "
+                    "created_at REAL, model TEXT)"
+                )
+                columns = {row[1] for row in self._db.execute("PRAGMA table_info(semantic_cache)")}
+                if 'model' not in columns:
+                    self._db.execute("ALTER TABLE semantic_cache ADD COLUMN model TEXT")
+                self._db.commit()
+                self._load_from_db()
+            except sqlite3.Error as e:
+                logger.warning(f"Answer cache {db_path} unavailable, using memory only: {e}")
+                self._db = None
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and created_at + self.ttl <= now
+
+    def _load_from_db(self):
+        """
+        Isi cache in-memory dari SQLite; entry kadaluarsa atau dari model lain dihapus,
+        hanya maxsize entry terbaru dimuat
+        """
+        now = time.time()
+        self._db.execute("DELETE FROM semantic_cache WHERE model IS NOT ?", (self.model_fingerprint,))
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM semantic_cache WHERE created_at <= ?", (now - self.ttl,))
+        rows = self._db.execute(
+            "SELECT id, tags, lang, embedding, answer, created_at FROM semantic_cache "
+            "ORDER BY created_at DESC LIMIT ?", (max(self.maxsize, 0),)
+        ).fetchall()
+        self._db.execute("DELETE FROM semantic_cache WHERE id NOT IN "
+                         "(SELECT id FROM semantic_cache ORDER BY created_at DESC LIMIT ?)", (max(self.maxsize, 0),))
+        self._db.commit()
+
+        for entry_id, tags, lang, blob, answer, created_at in reversed(rows):
+            key = (tuple(json.loads(tags)), lang)
+            self._entries[entry_id] = (key, created_at)
+            embedding = np.frombuffer(blob, dtype=np.float32) if blob is not None else None
+            self._groups.setdefault(key, {})[entry_id] = (embedding, answer)
+
+    def _persist(self, sql, params=()):
+        """
+        Jalankan satu perintah tulis ke SQLite. Cache bersifat best-effort: error (mis. database dipakai
+        proses lain) hanya di-log supaya tidak pernah menggagalkan request. Mengembalikan cursor atau None.
+        """
+        if self._db is None:
+            return None
+        try:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+        except sqlite3.Error as e:
+            logger.warning(f"Answer cache write failed: {e}")
+            try:
+                self._db.rollback()
+            except sqlite3.Error:
+                pass
+            return None
+
+    def _remove(self, entry_id, persist=True):
+        key, _ = self._entries.pop(entry_id)
+        group = self._groups[key]
+        del group[entry_id]
+        if not group:
+            del self._groups[key]
+        if persist and entry_id > 0:
+            self._persist("DELETE FROM semantic_cache WHERE id = ?", (entry_id,))
+
+    def lookup(self, embedding, tags, lang):
+        """Kembalikan jawaban yang di-cache untuk query yang mirip, atau None"""
+        key = (tuple(tags), lang)
+        now = time.time()
+        with self._lock:
+            group = self._groups.get(key, {})
+            best_id, best_score = None, self.threshold
+            for entry_id, (cached_embedding, _) in list(group.items()):
+                if self._expired(self._entries[entry_id][1], now):
+                    self._remove(entry_id)
+                    continue
+                if (cached_embedding is None) != (embedding is None):
+                    continue
+                score = 1.0 if embedding is None else float(np.dot(cached_embedding, embedding))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return group[best_id][1]
+
+    def store(self, embedding, tags, lang, answer):
+        """Simpan jawaban baru; entry paling lama tidak dipakai dibuang jika melebihi maxsize"""
+        if self.maxsize <= 0:
+            return
+        key = (tuple(tags), lang)
+        embedding = np.array(embedding, dtype=np.float32) if embedding is not None else None
+        created_at = time.time()
+        with self._lock:
+            # id dari SQLite (AUTOINCREMENT) supaya beberapa proses yang berbagi file tidak bentrok
+            cursor = self._persist(
+                "INSERT INTO semantic_cache (tags, lang, embedding, answer, created_at, model) VALUES (?, ?, ?, ?, ?, ?)",
+                (json.dumps(list(key[0])), lang, embedding.tobytes() if embedding is not None else None,
+                 answer, created_at, self.model_fingerprint),
+            )
+            if cursor is not None:
+                entry_id = cursor.lastrowid
+                if entry_id in self._entries:
+                    # Tabel lama tanpa AUTOINCREMENT bisa memakai ulang id yang sudah dihapus proses lain
+                    self._remove(entry_id, persist=False)
+            else:
+                entry_id = self._next_local_id
+                self._next_local_id -= 1
+            self._entries[entry_id] = (key, created_at)
+            self._groups.setdefault(key, {})[entry_id] = (embedding, answer)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self.hits = 0
+            self.misses = 0
+            self._persist("DELETE FROM semantic_cache")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Ringkasan counter cache: hits, misses, hit_rate, size, maxsize"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+class TranslationCache:
+    """
+    Cache translasi dua level, key (bahasa sumber, bahasa tujuan, teks yang dinormalisasi):
+    1. LRU in-process (memory_size entry)
+    2. SQLite di disk (opsional, db_path) yang bertahan setelah restart, dibatasi disk_size entry;
+       entry yang paling lama tidak dipakai dihapus lebih dulu
+    Error SQLite (mis. database dikunci worker lain) hanya di-log; cache tetap jalan dengan level memory.
+    """
+
+    def __init__(self, memory_size=2048, db_path=None, disk_size=100000):
+        self.memory = LRUCache(maxsize=memory_size)
+        self.disk_size = disk_size
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_count = 0
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "src TEXT, dest TEXT, text TEXT, translated TEXT, last_used REAL, PRIMARY KEY (src, dest, text))"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+                self._db.commit()
+                self._disk_count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache {db_path} unavailable, using memory only: {e}")
+                self._db = None
+
+    def _rollback(self, error):
+        logger.warning(f"Translation cache disk access failed: {error}")
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.lower().strip().split())
+
+    def get(self, src, dest, text):
+        """Kembalikan hasil translasi yang di-cache, atau None"""
+        key = (src, dest, self.normalize(text))
+        translated = self.memory.get(key)
+        if translated is not None:
+            return translated
+
+        if self._db is not None:
+            with self._lock:
+                row = None
+                try:
+                    row = self._db.execute(
+                        "SELECT translated FROM translations WHERE src = ? AND dest = ? AND text = ?", key
+                    ).fetchone()
+                    if row is not None:
+                        self._db.execute(
+                            "UPDATE translations SET last_used = ? WHERE src = ? AND dest = ? AND text = ?",
+                            (time.time(),) + key,
+                        )
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    # Hasil SELECT yang sudah didapat tetap dipakai walaupun update last_used gagal
+                    self._rollback(e)
+                if row is not None:
+                    self.disk_hits += 1
+                    self.memory.put(key, row[0])
+                    return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, src, dest, text, translated):
+        key = (src, dest, self.normalize(text))
+        self.memory.put(key, translated)
+        if self._db is None or self.disk_size <= 0:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO translations (src, dest, text, translated, last_used) VALUES (?, ?, ?, ?, ?)",
+                    key + (translated, time.time()),
+                )
+                # Perkiraan (REPLACE atas key yang sudah ada juga dihitung); dihitung ulang sebelum trimming
+                self._disk_count += 1
+                if self._disk_count > self.disk_size:
+                    self._disk_count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                if self._disk_count > self.disk_size:
+                    # Hapus 10% entry tertua sekaligus supaya trimming tidak terjadi di setiap put
+                    excess = self._disk_count - self.disk_size + max(1, self.disk_size // 10)
+                    self._db.execute(
+                        "DELETE FROM translations WHERE rowid IN "
+                        "(SELECT rowid FROM translations ORDER BY last_used ASC LIMIT ?)", (excess,)
+                    )
+                    self._disk_count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._rollback(e)
+
+    def stats(self):
+        """Ringkasan counter: memory_hits, disk_hits, misses, hit_rate, ukuran tiap level"""
+        memory_stats = self.memory.stats()
+        with self._lock:
+            hits = memory_stats['hits'] + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_hits': memory_stats['hits'],
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'memory_size': memory_stats['size'],
+                'disk_size': self._disk_count,
+            }
@@ -0,0 +1,403 @@
+import argparse
+import bisect
+import hashlib
+import html
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from kb_index import atomic_write, exact_search, index_paths, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# Versi format file course vectors (course_index.npy + course_index.meta.json)
+COURSE_VECTORS_VERSION = 2
+
+KEY_CONCEPTS_RE = re.compile(r'\n\s*Key Concepts:\s*\n', flags=re.IGNORECASE)
+CODE_EXAMPLE_RE = re.compile(r'\n\s*Code Example:\s*\n', flags=re.IGNORECASE)
+APPLICATIONS_RE = re.compile(r'\n\s*Applications:\s*\n', flags=re.IGNORECASE)
+CODE_BLOCK_RE = re.compile(r'(\w+):\s*```(?:\w+)?\s*\n([\s\S]*?)```', flags=re.IGNORECASE)
+SEARCH_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Bobot field pada search index: match di title paling berarti, applications paling lemah
+SEARCH_FIELD_WEIGHTS = {'title': 3.0, 'topics': 2.0, 'description': 1.0, 'applications': 1.0}
+
+
+def parse_course_content(content_text):
+    parsed = {
+        "overview": "",
+        "key_concepts": [],
+        "code_example": {"language": None, "code": ""},
+        "applications": []
+    }
+
+    # Pisahkan overview dari Key Concepts
+    overview_split = KEY_CONCEPTS_RE.split(content_text)
+    if len(overview_split) > 1:
+        parsed["overview"] = overview_split[0].strip()
+        rest = overview_split[1]
+    else:
+        parsed["overview"] = content_text.strip()
+        return parsed  # jika tidak ada bagian lain
+
+    # Pisahkan Key Concepts dari Code Example
+    key_split = CODE_EXAMPLE_RE.split(rest)
+    if len(key_split) > 1:
+        key_concepts_block = key_split[0].strip()
+        rest = key_split[1]
+    else:
+        key_concepts_block = rest.strip()
+        rest = ""
+
+    parsed["key_concepts"] = [line.strip() for line in key_concepts_block.splitlines() if line.strip()]
+
+    # Pisahkan Code Example dari Applications
+    code_split = APPLICATIONS_RE.split(rest)
+    if len(code_split) > 1:
+        code_block = code_split[0].strip()
+        apps_block = code_split[1].strip()
+    else:
+        code_block = rest.strip()
+        apps_block = ""
+
+    # Ambil bahasa dan kode program
+    lang_match = CODE_BLOCK_RE.search(code_block)
+    if lang_match:
+        parsed["code_example"]["language"] = lang_match.group(1).strip().lower()
+        parsed["code_example"]["code"] = html.unescape(
+            lang_match.group(2)
+        ).strip().replace('</p>', '').replace('</div>', '')
+
+    # Ambil Applications
+    if apps_block:
+        parsed["applications"] = [line.strip() for line in apps_block.splitlines() if line.strip()]
+
+    return parsed
+
+
+def extract_key_concepts(content_text, limit=None):
+    """Hanya bagian Key Concepts (untuk topic tag di card), tanpa mem-parse code example dan applications"""
+    overview_split = KEY_CONCEPTS_RE.split(content_text, maxsplit=1)
+    if len(overview_split) < 2:
+        return []
+    block = CODE_EXAMPLE_RE.split(overview_split[1], maxsplit=1)[0]
+    concepts = [line.strip() for line in block.splitlines() if line.strip()]
+    return concepts[:limit] if limit is not None else concepts
+
+
+def extract_applications(content_text):
+    """Hanya bagian Applications, sama dengan parse_course_content(...)['applications']"""
+    overview_split = KEY_CONCEPTS_RE.split(content_text, maxsplit=1)
+    if len(overview_split) < 2:
+        return []
+    apps_split = APPLICATIONS_RE.split(overview_split[1], maxsplit=1)
+    if len(apps_split) < 2:
+        return []
+    return [line.strip() for line in apps_split[1].strip().splitlines() if line.strip()]
+
+
+def tokenize(text):
+    return SEARCH_TOKEN_RE.findall(text.lower())
+
+
+def course_embedding_text(course, raw_content):
+    """Teks yang di-embed untuk semantic course search: title, paragraf pertama overview, dan key concepts"""
+    overview = KEY_CONCEPTS_RE.split(raw_content, maxsplit=1)[0].strip()
+    first_paragraph = overview.split('\n\n', 1)[0].strip()
+    key_concepts = extract_key_concepts(raw_content)
+    return '. '.join(part for part in [course['title'], first_paragraph, ', '.join(key_concepts)] if part)
+
+
+def file_signature(file_path):
+    """Versi file yang murah dicek di setiap rerun: (mtime_ns, size). Berubah setiap kali file ditulis ulang."""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _course_card(course_id, raw_content):
+    """Data ringkas untuk card course: title, description singkat, dan maksimal 4 topic"""
+    title = course_id.replace("_", " ").replace("-", " ").title()
+
+    # Deskripsi: dua baris pertama yang tidak kosong, maksimal 200 karakter
+    content_lines = []
+    for line in raw_content.split('\n'):
+        if line.strip():
+            content_lines.append(line.strip())
+            if len(content_lines) == 2:
+                break
+    description = " ".join(content_lines) if content_lines else "No description available."
+    description = (description[:200] + '...') if len(description) > 200 else description
+
+    # Topic dari "Key Concepts" jika ada, selain itu dari potongan id
+    topics = extract_key_concepts(raw_content, limit=4)
+    if not topics:
+        topics = [tag.strip() for tag in course_id.split('_')][:4]
+
+    return {
+        "id": course_id,
+        "title": title,
+        "description": description,
+        "topics": topics
+    }
+
+
+class CourseSearchIndex:
+    """
+    Inverted index untuk search box Course List.
+    Setiap term punya posting list {posisi course: bobot tf}, dengan tf dikalikan SEARCH_FIELD_WEIGHTS.
+    search() mencocokkan setiap kata query sebagai prefix (search-as-you-type) lewat vocabulary yang
+    diurutkan + bisect, hanya mengembalikan course yang cocok dengan semua kata, dan mengurutkan hasil dengan
+    skor BM25 (tf dinormalisasi panjang dokumen). Match kata utuh diberi skor lebih tinggi dari match prefix.
+    Biaya query bergantung pada panjang posting list, bukan jumlah course.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75, prefix_weight=0.6, max_expansions=50):
+        # documents: list of {field: text}, urutannya sama dengan CourseCatalog.courses
+        self.k1 = k1
+        self.prefix_weight = prefix_weight
+        self.max_expansions = max_expansions
+        self.n_docs = len(documents)
+
+        postings = defaultdict(dict)
+        lengths = []
+        for position, fields in enumerate(documents):
+            length = 0.0
+            for field, text in fields.items():
+                weight = SEARCH_FIELD_WEIGHTS[field]
+                for token in tokenize(text):
+                    postings[token][position] = postings[token].get(position, 0.0) + weight
+                    length += weight
+            lengths.append(length)
+
+        # Normalisasi panjang BM25 dilakukan sekali di sini, posting menyimpan tf yang sudah dinormalisasi
+        avg_length = sum(lengths) / len(lengths) if lengths else 1.0
+        for docs in postings.values():
+            for position in docs:
+                docs[position] /= 1 - b + b * lengths[position] / (avg_length or 1.0)
+        self.postings = dict(postings)
+        self.vocabulary = sorted(self.postings)
+        self.idf = {term: math.log(1 + self.n_docs / len(docs)) for term, docs in self.postings.items()}
+
+    def _expand(self, token):
+        """Term di vocabulary yang diawali token, maksimal max_expansions (term terpendek lebih dulu)"""
+        start = bisect.bisect_left(self.vocabulary, token)
+        end = bisect.bisect_left(self.vocabulary, token + '\uffff')
+        terms = self.vocabulary[start:end]
+        if len(terms) > self.max_expansions:
+            terms = sorted(terms, key=len)[:self.max_expansions]
+        return terms
+
+    def _token_scores(self, token):
+        """Skor per course untuk satu kata query (maksimum atas semua term hasil ekspansi prefix)"""
+        scores = {}
+        for term in self._expand(token):
+            boost = 1.0 if term == token else self.prefix_weight
+            idf = self.idf[term]
+            for position, tf in self.postings[term].items():
+                score = boost * idf * tf * (self.k1 + 1) / (tf + self.k1)
+                if score > scores.get(position, 0.0):
+                    scores[position] = score
+        return scores
+
+    def search(self, query, limit=None):
+        """Posisi course yang cocok, diurutkan dari skor tertinggi"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        # Kata dengan posting paling sedikit diproses dulu supaya kandidat cepat menyusut
+        per_token = sorted((self._token_scores(token) for token in tokens), key=len)
+        totals = dict(per_token[0])
+        for scores in per_token[1:]:
+            totals = {position: total + scores[position] for position, total in totals.items() if position in scores}
+            if not totals:
+                return []
+
+        ranked = sorted(totals, key=lambda position: (-totals[position], position))
+        return ranked[:limit] if limit is not None else ranked
+
+
+class CourseCatalog:
+    """
+    Katalog course hasil parse dataWeb.json.
+    - courses: list data card (title, description, topics), dibuat sekali saat load
+    - get(course_id): data card lewat map id -> course (O(1))
+    - detail(course_id): konten lengkap (overview, key concepts, code, applications) yang baru di-parse
+      saat course pertama kali dibuka, lalu disimpan
+    - search(query): pencarian ranked lewat CourseSearchIndex yang dibangun saat search pertama
+    Satu instance aman di-share antar session Streamlit (parse detail dan build index dilindungi lock).
+    """
+
+    def __init__(self, courses, raw_contents, signature=None, content_hash=None):
+        self.courses = courses
+        self.signature = signature
+        self.content_hash = content_hash  # sha256 dataWeb.json, versi katalog untuk course vectors
+        self._raw_contents = raw_contents  # course_id -> teks content mentah
+        self._by_id = {course['id']: course for course in courses}
+        self._details = {}
+        self._search_index = None
+        self._vectors = None  # matrix L2-normalized, baris sejajar dengan self.courses
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_json(cls, file_path="dataWeb.json"):
+        signature = file_signature(file_path)
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+
+        courses = []
+        raw_contents = {}
+        for course_json in data.get("courses", []):
+            course_id = course_json.get("id")
+            if not course_id:
+                continue
+            raw_content = course_json.get("content", "")
+            courses.append(_course_card(course_id, raw_content))
+            raw_contents[course_id] = raw_content
+        return cls(courses, raw_contents, signature=signature, content_hash=hashlib.sha256(raw).hexdigest())
+
+    def get(self, course_id):
+        """Data card sebuah course, atau None jika id tidak dikenal"""
+        return self._by_id.get(course_id)
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            with self._lock:
+                if self._search_index is None:
+                    self._search_index = CourseSearchIndex([
+                        {
+                            'title': course['title'],
+                            'description': course['description'],
+                            'topics': ' '.join(extract_key_concepts(self._raw_contents[course['id']])),
+                            'applications': ' '.join(extract_applications(self._raw_contents[course['id']])),
+                        }
+                        for course in self.courses
+                    ])
+        return self._search_index
+
+    def search(self, query, limit=None):
+        """Course yang cocok dengan query (semua kata, setiap kata boleh berupa awalan), urut dari paling relevan"""
+        return [self.courses[position] for position in self.search_index.search(query, limit)]
+
+    @property
+    def has_vectors(self):
+        return self._vectors is not None
+
+    def embedding_texts(self):
+        return [course_embedding_text(course, self._raw_contents[course['id']]) for course in self.courses]
+
+    def load_vectors(self, index_path="course_index", encode_fn=None, model_fingerprint=None):
+        """
+        Pasang course vectors yang sudah di-precompute (lihat CLI di bawah). File yang hilang atau dibuat
+        untuk versi katalog / model lain dibangun ulang dengan encode_fn (jika diberikan) lalu disimpan.
+        Build bisa lama untuk katalog besar, jadi panggil dari background thread, bukan saat user mengetik.
+        Mengembalikan True jika semantic search siap dipakai.
+        """
+        if self._vectors is not None:
+            return True
+        with self._lock:
+            if self._vectors is not None:
+                return True
+            vectors = load_course_vectors(index_path, self, model_fingerprint)
+            if vectors is None and encode_fn is not None:
+                vectors = build_course_vectors(self, encode_fn, index_path, model_fingerprint)
+            self._vectors = vectors
+            return vectors is not None
+
+    def semantic_search(self, query_embedding, limit=20, min_score=0.3):
+        """Course paling mirip dengan query embedding (satu matmul), sebagai list (course, similarity)"""
+        if self._vectors is None or not len(self.courses):
+            return []
+        indices, scores = exact_search(self._vectors, query_embedding, limit)
+        return [(self.courses[idx], float(score)) for idx, score in zip(indices[0], scores[0]) if score >= min_score]
+
+    def detail(self, course_id):
+        """Konten lengkap sebuah course (hasil parse_course_content), atau None jika id tidak dikenal"""
+        parsed = self._details.get(course_id)
+        if parsed is not None:
+            return parsed
+        raw_content = self._raw_contents.get(course_id)
+        if raw_content is None:
+            return None
+        parsed = parse_course_content(raw_content)
+        with self._lock:
+            return self._details.setdefault(course_id, parsed)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def __contains__(self, course_id):
+        return course_id in self._by_id
+
+
+def load_course_vectors(index_path, catalog, model_fingerprint=None):
+    """
+    Load course vectors dari disk; None jika file tidak ada, dibuat untuk versi katalog lain, atau
+    (jika model_fingerprint diberikan) dibuat dengan model embedding lain, mis. sebelum training ulang
+    """
+    matrix_path, meta_path = index_paths(index_path)
+    if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if (meta.get('version') != COURSE_VECTORS_VERSION or meta.get('catalog_hash') != catalog.content_hash
+            or meta.get('ids') != [course['id'] for course in catalog.courses]
+            or (model_fingerprint is not None and meta.get('model') != model_fingerprint)):
+        return None
+    vectors = np.load(matrix_path)
+    if vectors.shape[0] != len(catalog.courses):
+        return None
+    return vectors
+
+
+def build_course_vectors(catalog, encode_fn, index_path=None, model_fingerprint=None):
+    """
+    Embed semua course dengan encode_fn (list teks -> matrix) dan simpan ke index_path (jika diberikan).
+    Metadata mencatat hash katalog dan fingerprint model supaya vectors otomatis dianggap basi ketika
+    dataWeb.json berubah atau model dilatih ulang.
+    """
+    vectors = np.ascontiguousarray(normalize_rows(encode_fn(catalog.embedding_texts())), dtype=np.float32)
+    if index_path:
+        matrix_path, meta_path = index_paths(index_path)
+        meta = {
+            'version': COURSE_VECTORS_VERSION,
+            'catalog_hash': catalog.content_hash,
+            'model': model_fingerprint,
+            'count': len(vectors),
+            'dim': int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            'ids': [course['id'] for course in catalog.courses],
+        }
+        try:
+            atomic_write(matrix_path, lambda f: np.save(f, vectors))
+            atomic_write(meta_path, lambda f: json.dump(meta, f, ensure_ascii=False), mode='w')
+        except OSError as e:
+            logger.warning(f"Could not write course vectors {matrix_path}: {e}")
+    return vectors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute course vectors for semantic course search")
+    parser.add_argument("catalog_file", nargs="?", default="dataWeb.json")
+    parser.add_argument("index_path", nargs="?", default="course_index")
+    parser.add_argument("--model", default="best_embedding_model", help="SentenceTransformer model path")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from build_kb import model_fingerprint
+
+    model = SentenceTransformer(args.model)
+    catalog = CourseCatalog.from_json(args.catalog_file)
+    vectors = build_course_vectors(
+        catalog, lambda texts: model.encode(texts, convert_to_numpy=True, normalize_embeddings=True), args.index_path,
+        model_fingerprint(args.model)
+    )
+    matrix_path, meta_path = index_paths(args.index_path)
+    print(f"Embedded {len(vectors)} courses into {matrix_path} and {meta_path}")
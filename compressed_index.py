@@ -0,0 +1,238 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from kb_index import KnowledgeIndex, atomic_write, exact_search, normalize_rows, top_k_indices
+
+# Jumlah bit 1 untuk setiap nilai byte, dipakai untuk jarak Hamming
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+COMPRESSION_MODES = ('float16', 'int8', 'binary')
+
+
+def _blocks(n, block_size):
+    for start in range(0, n, block_size):
+        yield start, min(start + block_size, n)
+
+
+class CompressedSearcher:
+    """
+    Search dua tahap atas representasi terkompresi yang disimpan di RAM:
+    1. Skor kasar semua baris memakai codes ('float16', 'int8' dengan scale per dimensi, atau 'binary'
+       1 bit per dimensi dengan jarak Hamming), opsional setelah proyeksi PCA ke pca_dim dimensi
+    2. rescore kandidat teratas diskor ulang dengan matrix float32 asli (memory-mapped, hanya baris
+       kandidat yang dibaca dari disk) lalu diambil top-k
+    """
+
+    mode = None
+
+    def __init__(self, embeddings, mode, codes, scales=None, pca_mean=None, pca_components=None, rescore=100):
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f"Unknown compression mode '{mode}'. Choose from: {', '.join(COMPRESSION_MODES)}")
+        self.embeddings = embeddings
+        self.mode = mode
+        self.codes = codes
+        self.scales = scales
+        self.pca_mean = pca_mean
+        self.pca_components = pca_components  # (dim, pca_dim)
+        self.rescore = rescore
+
+    @property
+    def name(self):
+        return self.mode
+
+    @property
+    def memory_bytes(self):
+        """Ukuran codes + parameter kompresi di RAM (matrix float32 tetap di disk)"""
+        extra = [self.scales, self.pca_mean, self.pca_components]
+        return self.codes.nbytes + sum(array.nbytes for array in extra if array is not None)
+
+    @staticmethod
+    def _fit_pca(embeddings, pca_dim, sample_size=50000, seed=0):
+        rng = np.random.default_rng(seed)
+        n = len(embeddings)
+        sample_ids = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+        sample = np.asarray(embeddings[sample_ids], dtype=np.float32)
+        mean = sample.mean(axis=0)
+        # Komponen utama = right singular vectors dari data yang sudah di-center
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        return mean.astype(np.float32), np.ascontiguousarray(vt[:pca_dim].T, dtype=np.float32)
+
+    def _project(self, vectors, center=True):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.pca_components is None:
+            return vectors
+        if center:
+            vectors = vectors - self.pca_mean
+        # Untuk skor dot product query tidak perlu di-center: q.x = q.mean + (q W).((x - mean) W) kira-kira,
+        # dan q.mean sama untuk semua baris sehingga urutan skor tidak berubah
+        return vectors @ self.pca_components
+
+    @classmethod
+    def build(cls, embeddings, mode=None, pca_dim=None, rescore=100, block_size=65536):
+        """Kompres matrix per blok supaya matrix besar tidak perlu dibaca sekaligus ke RAM"""
+        mode = mode or cls.mode or 'int8'
+        pca_mean = pca_components = None
+        if pca_dim:
+            pca_mean, pca_components = cls._fit_pca(embeddings, pca_dim)
+        searcher = cls(embeddings, mode, None, pca_mean=pca_mean, pca_components=pca_components, rescore=rescore)
+
+        n = len(embeddings)
+        dim = pca_dim or embeddings.shape[1]
+        if mode == 'int8':
+            # Scale simetris per dimensi: nilai absolut maksimum dipetakan ke 127
+            max_abs = np.zeros(dim, dtype=np.float32)
+            for start, end in _blocks(n, block_size):
+                block = searcher._project(embeddings[start:end])
+                max_abs = np.maximum(max_abs, np.abs(block).max(axis=0))
+            max_abs[max_abs == 0] = 1.0
+            searcher.scales = (max_abs / 127.0).astype(np.float32)
+
+        if mode == 'binary':
+            codes = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+        else:
+            codes = np.empty((n, dim), dtype=np.float16 if mode == 'float16' else np.int8)
+        for start, end in _blocks(n, block_size):
+            codes[start:end] = searcher._encode(searcher._project(embeddings[start:end]))
+        searcher.codes = codes
+        return searcher
+
+    def _encode(self, vectors):
+        if self.mode == 'float16':
+            return vectors.astype(np.float16)
+        if self.mode == 'int8':
+            return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+        return np.packbits(vectors > 0, axis=1)
+
+    def _coarse_scores(self, queries, block_size=65536):
+        """Skor kasar (n_queries, n). Untuk binary: -jarak Hamming, makin besar makin mirip"""
+        n = len(self.codes)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        if self.mode == 'binary':
+            query_codes = np.packbits(queries > 0, axis=1)
+            for start, end in _blocks(n, block_size):
+                block = self.codes[start:end]
+                for row, query_code in enumerate(query_codes):
+                    scores[row, start:end] = -POPCOUNT[np.bitwise_xor(block, query_code)].sum(axis=1, dtype=np.int32)
+            return scores
+
+        # int8: q . (codes * scale) = (q * scale) . codes
+        weighted = queries * self.scales if self.mode == 'int8' else queries
+        for start, end in _blocks(n, block_size):
+            scores[:, start:end] = weighted @ self.codes[start:end].astype(np.float32).T
+        return scores
+
+    def search(self, query_embeddings, k, rescore=None):
+        """rescore=0 mengembalikan hasil tahap kasar saja (skor terkompresi, untuk mengukur recall)"""
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        rescore = self.rescore if rescore is None else rescore
+        # Binary membandingkan tanda proyeksi, jadi query di-center sama seperti saat codes dibangun
+        coarse = self._coarse_scores(self._project(query_embeddings, center=self.mode == 'binary'))
+        candidates = top_k_indices(coarse, max(k, rescore))
+        if not rescore:
+            return candidates.astype(np.int64), np.take_along_axis(coarse, candidates, axis=-1)
+
+        # Rescoring full precision hanya untuk kandidat
+        indices = np.empty((len(query_embeddings), min(k, candidates.shape[1])), dtype=np.int64)
+        scores = np.empty(indices.shape, dtype=np.float32)
+        for row, (query, row_candidates) in enumerate(zip(query_embeddings, candidates)):
+            row_candidates = np.sort(row_candidates)  # akses memory-map berurutan
+            exact = np.asarray(self.embeddings[row_candidates], dtype=np.float32) @ query
+            best = top_k_indices(exact, k)
+            indices[row] = row_candidates[best]
+            scores[row] = exact[best]
+        return indices, scores
+
+    def save(self, path, index_id=None):
+        """index_id: identitas matrix sumber (KnowledgeIndex.matrix_hash), dicek lagi saat load"""
+        arrays = {'codes': self.codes}
+        for name in ('scales', 'pca_mean', 'pca_components'):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        meta = {'count': len(self.embeddings), 'mode': self.mode, 'rescore': self.rescore, 'index_id': index_id}
+        atomic_write(path, lambda f: np.savez(f, meta=np.array(json.dumps(meta)), **arrays))
+
+    @classmethod
+    def load(cls, path, embeddings, rescore=None, index_id=None):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['count'] != len(embeddings):
+                raise ValueError(f"Compressed index {path} was built for {meta['count']} rows, index has {len(embeddings)}")
+            if meta.get('index_id') != index_id:
+                # Jumlah baris sama belum berarti isinya sama (mis. faq.json diedit tanpa menambah entry)
+                raise ValueError(f"Compressed index {path} was built from a different index matrix")
+            optional = {name: data[name] if name in data else None for name in ('scales', 'pca_mean', 'pca_components')}
+            return cls(embeddings, meta['mode'], data['codes'], rescore=rescore or meta['rescore'], **optional)
+
+
+class Float16Searcher(CompressedSearcher):
+    mode = 'float16'
+
+
+class Int8Searcher(CompressedSearcher):
+    mode = 'int8'
+
+
+class BinarySearcher(CompressedSearcher):
+    mode = 'binary'
+
+
+def recall_at_k(reference_indices, indices):
+    """Fraksi hasil top-k exact yang juga ditemukan searcher terkompresi"""
+    k = reference_indices.shape[1]
+    hits = sum(len(np.intersect1d(ref, got[got >= 0])) for ref, got in zip(reference_indices, indices))
+    return hits / (len(reference_indices) * k)
+
+
+def evaluate_modes(embeddings, queries, k=5, modes=COMPRESSION_MODES, pca_dim=None, rescore=100):
+    """
+    Bandingkan setiap mode dengan baseline float32 exact: memory, recall@k tanpa dan dengan rescoring,
+    dan latency per query. Mengembalikan list dict (satu per mode).
+    """
+    embeddings_f32 = np.asarray(embeddings, dtype=np.float32)
+    reference, _ = exact_search(embeddings_f32, queries, k)
+    baseline_bytes = embeddings_f32.nbytes
+    reports = [{'mode': 'float32', 'pca_dim': None, 'memory_mb': baseline_bytes / 1e6, 'compression': 1.0,
+                'recall_coarse': 1.0, 'recall_rescored': 1.0}]
+
+    for mode in modes:
+        for dim in ([None, pca_dim] if pca_dim else [None]):
+            searcher = CompressedSearcher.build(embeddings, mode, pca_dim=dim, rescore=rescore)
+            coarse_indices, _ = searcher.search(queries, k, rescore=0)
+            start = time.perf_counter()
+            rescored, _ = searcher.search(queries, k)
+            elapsed = time.perf_counter() - start
+            reports.append({
+                'mode': mode,
+                'pca_dim': dim,
+                'memory_mb': searcher.memory_bytes / 1e6,
+                'compression': baseline_bytes / searcher.memory_bytes,
+                'recall_coarse': recall_at_k(reference, coarse_indices),
+                'recall_rescored': recall_at_k(reference, rescored),
+                'ms_per_query': elapsed * 1000 / len(queries),
+            })
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure memory / recall@k trade-offs of compressed index representations")
+    parser.add_argument("index_path", nargs="?", default="faq_index")
+    parser.add_argument("--modes", nargs="+", choices=COMPRESSION_MODES, default=list(COMPRESSION_MODES))
+    parser.add_argument("--pca-dim", type=int, default=None, help="also evaluate each mode after PCA to this many dims")
+    parser.add_argument("--rescore", type=int, default=100, help="candidates rescored at full precision")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500, help="sampled index rows (plus noise) used as queries")
+    parser.add_argument("--noise", type=float, default=0.05)
+    args = parser.parse_args()
+
+    kb = KnowledgeIndex.load(args.index_path)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(kb), size=min(args.queries, len(kb)), replace=False)
+    queries = np.asarray(kb.embeddings[np.sort(sample)], dtype=np.float32)
+    queries = normalize_rows(queries + rng.normal(scale=args.noise, size=queries.shape).astype(np.float32))
+
+    print(f"{'mode':<8} {'pca':>5} {'memory MB':>10} {'ratio':>6} {'recall@' + str(args.k):>9} {'rescored':>9} {'ms/query':>9}")
+    for report in evaluate_modes(kb.embeddings, queries, args.k, args.modes, args.pca_dim, args.rescore):
+        print(f"{report['mode']:<8} {report['pca_dim'] or '-':>5} {report['memory_mb']:>10.2f} {report['compression']:>6.1f} "
+              f"{report['recall_coarse']:>9.3f} {report['recall_rescored']:>9.3f} {report.get('ms_per_query', 0):>9.3f}")
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: benchmark tanpa pengukuran RSS
+    resource = None
+
+from kb_index import normalize_rows
+
+ENCODER_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+ONNX_DIR = 'onnx'
+ONNX_FILES = {'onnx': 'model.onnx', 'onnx-int8': 'model_int8.onnx'}
+
+
+def onnx_path(model_path, backend='onnx-int8'):
+    """Lokasi file ONNX hasil export, disimpan di dalam folder model"""
+    return os.path.join(model_path, ONNX_DIR, ONNX_FILES[backend])
+
+
+def _read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class OnnxEncoder:
+    """
+    Query encoder tanpa torch: tokenizer Rust (tokenizers) + onnxruntime di CPU.
+    Pooling dibaca dari 1_Pooling/config.json dan normalisasi dari modules.json, sama seperti pipeline
+    SentenceTransformer, sehingga embedding bisa dibandingkan langsung dengan knowledge base.
+    encode() menerima argumen yang sama dengan SentenceTransformer.encode yang dipakai di repo ini.
+    """
+
+    def __init__(self, model_path, backend='onnx-int8', num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = onnx_path(model_path, backend)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found. Export it first: python encoders.py export {model_path}")
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+        st_config = _read_json(os.path.join(model_path, 'sentence_bert_config.json'), {})
+        tokenizer_config = _read_json(os.path.join(model_path, 'tokenizer_config.json'), {})
+        self.max_seq_length = st_config.get('max_seq_length') or tokenizer_config.get('model_max_length', 512)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        pad_token = tokenizer_config.get('pad_token', '[PAD]')
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token), pad_token=pad_token)
+
+        pooling = _read_json(os.path.join(model_path, '1_Pooling', 'config.json'), {'pooling_mode_mean_tokens': True})
+        self.pooling = pooling
+        self.dimension = pooling.get('word_embedding_dimension')
+        modules = _read_json(os.path.join(model_path, 'modules.json'), [])
+        self.normalize = any(module.get('type', '').endswith('Normalize') for module in modules)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _pool(self, token_embeddings, attention_mask):
+        """Pooling token embedding seperti sentence_transformers.models.Pooling"""
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = []
+        if self.pooling.get('pooling_mode_cls_token'):
+            pooled.append(token_embeddings[:, 0])
+        if self.pooling.get('pooling_mode_max_tokens'):
+            masked = np.where(mask > 0, token_embeddings, -1e9)
+            pooled.append(masked.max(axis=1))
+        if self.pooling.get('pooling_mode_mean_tokens') or self.pooling.get('pooling_mode_mean_sqrt_len_tokens'):
+            summed = (token_embeddings * mask).sum(axis=1)
+            counts = np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.pooling.get('pooling_mode_mean_tokens'):
+                pooled.append(summed / counts)
+            if self.pooling.get('pooling_mode_mean_sqrt_len_tokens'):
+                pooled.append(summed / np.sqrt(counts))
+        if not pooled:
+            raise ValueError(f"Unsupported pooling config: {self.pooling}")
+        return np.concatenate(pooled, axis=1)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Urutkan berdasarkan panjang supaya padding di setiap batch minimal (seperti SentenceTransformer)
+        order = np.argsort([-len(sentence) for sentence in sentences], kind='stable')
+        embeddings = np.empty((len(sentences), self.dimension or 0), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            batch_ids = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([sentences[i] for i in batch_ids])
+            feeds = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            pooled = self._pool(token_embeddings, feeds['attention_mask'])
+            if embeddings.shape[1] != pooled.shape[1]:
+                embeddings = np.empty((len(sentences), pooled.shape[1]), dtype=np.float32)
+                self.dimension = pooled.shape[1]
+            embeddings[batch_ids] = pooled
+
+        if self.normalize or normalize_embeddings:
+            embeddings = normalize_rows(embeddings)
+        return embeddings[0] if single else embeddings
+
+
+def load_encoder(model_path, backend='torch'):
+    """
+    Encoder query untuk RAGChatbot:
+    - 'torch': SentenceTransformer (default, butuh torch)
+    - 'onnx' / 'onnx-int8': OnnxEncoder, hasil `python encoders.py export`; tidak butuh torch saat runtime
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}'. Choose from: {', '.join(ENCODER_BACKENDS)}")
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_path)
+    return OnnxEncoder(model_path, backend)
+
+
+def export_onnx(model_path, quantize=True, opset=14):
+    """
+    Export transformer dari folder model ke ONNX (output: token embeddings, pooling dilakukan di OnnxEncoder),
+    lalu buat versi int8 dengan dynamic quantization. Hanya langkah ini yang butuh torch + transformers.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = TokenEmbeddings(AutoModel.from_pretrained(model_path)).eval()
+    dummy = tokenizer(["what is a binary search tree"], return_tensors='pt')
+    names = ['input_ids', 'attention_mask', 'token_type_ids']
+
+    fp32_path = onnx_path(model_path, 'onnx')
+    os.makedirs(os.path.dirname(fp32_path), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(dummy[name] for name in names), fp32_path,
+            input_names=names, output_names=['token_embeddings'],
+            dynamic_axes={name: {0: 'batch', 1: 'sequence'} for name in names + ['token_embeddings']},
+            opset_version=opset,
+        )
+    paths = [fp32_path]
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = onnx_path(model_path, 'onnx-int8')
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        paths.append(int8_path)
+    return paths
+
+
+def check_parity(reference, candidate, sentences, batch_size=64):
+    """
+    Bandingkan embedding dua encoder: cosine per kalimat dan kesepakatan top-1 retrieval
+    (query dari candidate dicari di matrix reference, seperti query ONNX terhadap knowledge base torch).
+    """
+    ref = normalize_rows(reference.encode(sentences, batch_size=batch_size, convert_to_numpy=True))
+    cand = normalize_rows(candidate.encode(sentences, batch_size=batch_size, convert_to_numpy=True))
+    cosines = np.sum(ref * cand, axis=1)
+
+    ref_scores = ref @ ref.T
+    cand_scores = cand @ ref.T
+    np.fill_diagonal(ref_scores, -np.inf)
+    np.fill_diagonal(cand_scores, -np.inf)
+    agreement = float(np.mean(np.argmax(ref_scores, axis=1) == np.argmax(cand_scores, axis=1)))
+    return {
+        'sentences': len(sentences),
+        'min_cosine': float(cosines.min()),
+        'mean_cosine': float(cosines.mean()),
+        'top1_agreement': agreement,
+    }
+
+
+def benchmark(encoder, queries, warmup=5):
+    """Latency encode satu query per panggilan (seperti saat chat), dalam milidetik"""
+    for query in queries[:warmup]:
+        encoder.encode([query], convert_to_numpy=True)
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode([query], convert_to_numpy=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        'queries': len(queries),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'mean_ms': float(timings.mean()),
+    }
+
+
+def _sample_patterns(data_file, limit):
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    patterns = [pattern for intent in data.get('intents', []) for pattern in intent.get('patterns', [])]
+    return patterns[:limit]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export, verify and benchmark the ONNX query encoder")
+    parser.add_argument("command", choices=['export', 'check', 'bench'])
+    parser.add_argument("model_path", nargs="?", default="best_embedding_model")
+    parser.add_argument("--backend", choices=ENCODER_BACKENDS, default='onnx-int8', help="encoder for check / bench")
+    parser.add_argument("--no-quantize", action="store_true", help="export: skip the int8 model")
+    parser.add_argument("--data", default="data.json", help="patterns used as parity / benchmark queries")
+    parser.add_argument("--limit", type=int, default=400)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        for path in export_onnx(args.model_path, quantize=not args.no_quantize):
+            print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    elif args.command == 'check':
+        sentences = _sample_patterns(args.data, args.limit)
+        report = check_parity(load_encoder(args.model_path, 'torch'), load_encoder(args.model_path, args.backend), sentences)
+        print(json.dumps(report, indent=2))
+    else:
+        # Jalankan sekali per backend (proses terpisah) supaya peak RSS bisa dibandingkan
+        queries = _sample_patterns(args.data, args.limit)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+        start = time.perf_counter()
+        encoder = load_encoder(args.model_path, args.backend)
+        report = {'backend': args.backend, 'load_seconds': time.perf_counter() - start}
+        report.update(benchmark(encoder, queries))
+        if resource:
+            # ru_maxrss dalam KB di Linux
+            report['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            report['load_rss_mb'] = report['peak_rss_mb'] - rss_before / 1024
+        print(json.dumps(report, indent=2))
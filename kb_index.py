@@ -0,0 +1,305 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# Versi format index; naikkan jika layout metadata berubah
+INDEX_VERSION = 2
+
+
+def preprocess_text(text):
+    """Normalisasi teks sebelum di-encode; dipakai sama persis untuk query dan pattern knowledge base"""
+    return ' '.join(text.lower().strip().split())
+
+
+def index_paths(index_path):
+    """Kembalikan path file matrix (.npy) dan metadata sidecar (.meta.json) dari sebuah index"""
+    base = index_path[:-4] if index_path.endswith('.npy') else index_path
+    return base + '.npy', base + '.meta.json'
+
+
+def matrix_file(index_path, matrix_hash):
+    """File matrix per generasi (nama berisi hash isinya), ditunjuk oleh field 'matrix' di metadata"""
+    return f"{index_paths(index_path)[0][:-4]}.{matrix_hash[:16]}.npy"
+
+
+def _matrix_generations(index_path):
+    return glob.glob(index_paths(index_path)[0][:-4] + '.' + '[0-9a-f]' * 16 + '.npy')
+
+
+def index_exists(index_path):
+    """Cek apakah file matrix dan metadata index sudah ada"""
+    matrix_path, meta_path = index_paths(index_path)
+    return os.path.exists(meta_path) and (os.path.exists(matrix_path) or bool(_matrix_generations(index_path)))
+
+
+def normalize_rows(matrix):
+    """L2-normalisasi setiap baris supaya cosine similarity cukup dihitung dengan dot product"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores, k):
+    """
+    Ambil indeks top-k (urut descending) pada axis terakhir.
+    np.argpartition memilih kandidat dalam O(n), lalu hanya k kandidat itu yang di-sort.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def exact_search(embeddings, query_embeddings, k):
+    """Brute-force search: skor semua baris dengan satu matmul, lalu ambil top-k"""
+    query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+    scores = query_embeddings @ embeddings.T
+    indices = top_k_indices(scores, k)
+    return indices, np.take_along_axis(scores, indices, axis=-1)
+
+
+def atomic_write(path, write_fn, mode='wb'):
+    """Tulis file ke temp file di folder yang sama lalu os.replace, supaya reader tidak pernah melihat file setengah jadi"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        encoding = None if 'b' in mode else 'utf-8'
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build_tag_table(rows):
+    """
+    Normalisasi pasangan (tag, responses) per baris menjadi tabel tag: setiap tag beserta list
+    response-nya disimpan sekali, baris hanya menyimpan tag_id. Intent dengan nama tag sama
+    digabung (response-nya di-union, urutan dipertahankan), seperti dedupe context di prompt.
+    Mengembalikan (tag_ids int32, tag_names, tag_responses).
+    """
+    lookup, tag_ids, tag_names, tag_responses = {}, [], [], []
+    for tag, responses in rows:
+        if tag not in lookup:
+            lookup[tag] = len(tag_names)
+            tag_names.append(tag)
+            tag_responses.append([])
+        merged = tag_responses[lookup[tag]]
+        merged.extend(response for response in responses if response not in merged)
+        tag_ids.append(lookup[tag])
+    return np.array(tag_ids, dtype=np.int32), tag_names, tag_responses
+
+
+class KnowledgeIndex:
+    """
+    Knowledge base hasil kompilasi, dalam bentuk ternormalisasi:
+    - embeddings: matrix float32 (n_patterns x dim) yang sudah L2-normalized, dibuka dengan memory-map
+    - tag_ids / patterns: tabel pattern, sejajar dengan baris embedding (tag_ids array int32)
+    - tag_names / tag_responses: tabel tag, list response setiap tag hanya disimpan sekali
+    - build: info build opsional (mis. fingerprint model dari build_kb.py) untuk incremental rebuild
+    - matrix_hash: sha256 matrix yang disimpan (None untuk index in-memory / format lama); dipakai
+      file turunan seperti index ANN untuk mendeteksi bahwa mereka dibangun dari matrix lain
+    """
+
+    def __init__(self, embeddings, tag_ids, patterns, tag_names, tag_responses, build=None, matrix_hash=None):
+        self.embeddings = embeddings
+        self.tag_ids = np.asarray(tag_ids, dtype=np.int32)
+        self.patterns = patterns
+        self.tag_names = tag_names
+        self.tag_responses = tag_responses
+        self.build = build or {}
+        self.matrix_hash = matrix_hash
+
+    def __len__(self):
+        return len(self.tag_ids)
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    @property
+    def n_tags(self):
+        return len(self.tag_names)
+
+    def tag(self, idx):
+        """Nama tag dari satu baris index"""
+        return self.tag_names[self.tag_ids[idx]]
+
+    def entry(self, idx):
+        """Ambil metadata satu baris index dalam bentuk dict seperti entry faq.json"""
+        tag_id = self.tag_ids[idx]
+        return {
+            'tag': self.tag_names[tag_id],
+            'original_pattern': self.patterns[idx],
+            'responses': self.tag_responses[tag_id],
+        }
+
+    def aggregate_tags(self, rows, scores, k, mode='max'):
+        """
+        Gabungkan hit per baris (urut dari yang terbaik) menjadi hit per tag:
+        - 'max': skor tag = skor pattern terbaiknya, urutan tag mengikuti hit pertamanya di ranking
+        - 'mean': skor tag = rata-rata skor pattern tag itu yang ikut ter-retrieve, diurutkan ulang
+        Mengembalikan (tag_ids, scores, best_rows, hits) untuk maksimal k tag; best_rows adalah
+        pattern dengan ranking terbaik di setiap tag dan hits jumlah pattern yang ter-retrieve.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float32)
+        keep = rows >= 0
+        rows, scores = rows[keep], scores[keep]
+        if not len(rows):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0, dtype=np.float32), empty, empty
+
+        tags, first, inverse, hits = np.unique(self.tag_ids[rows], return_index=True,
+                                               return_inverse=True, return_counts=True)
+        if mode == 'max':
+            aggregated = np.full(len(tags), -np.inf, dtype=np.float32)
+            np.maximum.at(aggregated, inverse, scores)
+            order = np.argsort(first, kind='stable')
+        elif mode == 'mean':
+            aggregated = (np.bincount(inverse, weights=scores) / hits).astype(np.float32)
+            order = np.argsort(-aggregated, kind='stable')
+        else:
+            raise ValueError(f"Unknown tag aggregation '{mode}'. Choose from: max, mean")
+        order = order[:k]
+        return tags[order].astype(np.int64), aggregated[order], rows[first[order]], hits[order]
+
+    @classmethod
+    def from_faq_entries(cls, faq_data):
+        """Bangun index in-memory dari list entry format faq.json lama (satu entry per pattern)"""
+        tag_ids, tag_names, tag_responses = build_tag_table((entry['tag'], entry['responses']) for entry in faq_data)
+        patterns = [entry['original_pattern'] for entry in faq_data]
+
+        if faq_data:
+            embeddings = normalize_rows([entry['embedding'] for entry in faq_data])
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        return cls(embeddings, tag_ids, patterns, tag_names, tag_responses)
+
+    @classmethod
+    def load(cls, index_path, mmap=True):
+        """Load index dari disk. Dengan mmap=True matrix tidak dibaca ke RAM, tapi di-share lewat page cache"""
+        matrix_path, meta_path = index_paths(index_path)
+        for attempt in range(2):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('matrix'):
+                # Format baru: metadata menunjuk file matrix generasinya sendiri, jadi tidak pernah
+                # dipasangkan dengan matrix dari save lain
+                matrix_path = os.path.join(os.path.dirname(os.path.abspath(meta_path)), meta['matrix'])
+            if os.path.exists(matrix_path) or attempt:
+                break
+            # save() lain baru saja mengganti metadata dan menghapus generasi lama: baca ulang sekali
+
+        version = meta.get('version')
+        if version == 1:
+            # Format lama: tag per baris + tabel responses; dinormalisasi menjadi tabel tag saat load
+            responses = meta['responses']
+            tag_ids, tag_names, tag_responses = build_tag_table(
+                (tag, responses[response_id]) for tag, response_id in zip(meta['tags'], meta['response_ids'])
+            )
+        elif version == INDEX_VERSION:
+            tag_ids = np.array(meta['tag_ids'], dtype=np.int32)
+            tag_names, tag_responses = meta['tag_names'], meta['tag_responses']
+        else:
+            raise ValueError(f"Unsupported index version {version} in {meta_path}")
+
+        embeddings = np.load(matrix_path, mmap_mode='r' if mmap else None)
+        if embeddings.dtype != np.float32:
+            raise ValueError(f"Index matrix {matrix_path} must be float32, got {embeddings.dtype}")
+        if embeddings.shape[0] != len(tag_ids) or len(tag_ids) != len(meta['patterns']):
+            raise ValueError(f"Index matrix {matrix_path} has {embeddings.shape[0]} rows "
+                             f"but metadata has {len(tag_ids)} entries")
+
+        if not meta.get('normalized', False):
+            # Index lama yang belum dinormalisasi: normalisasi sekali di memory (tidak lagi memory-mapped)
+            embeddings = normalize_rows(embeddings)
+
+        return cls(embeddings, tag_ids, meta['patterns'], tag_names, tag_responses, build=meta.get('build'),
+                   matrix_hash=meta.get('matrix_sha256'))
+
+    def search(self, query_embeddings, k):
+        """
+        Cari top-k baris untuk satu atau banyak query embedding (sudah L2-normalized).
+        Semua query dihitung dengan satu matmul. Mengembalikan (indices, scores) berbentuk (n_queries, k).
+        """
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        scores = query_embeddings @ self.embeddings.T
+        indices = top_k_indices(scores, k)
+        return indices, np.take_along_axis(scores, indices, axis=-1)
+
+    def save(self, index_path):
+        """
+        Simpan matrix (.npy float32) dan metadata sidecar secara atomic sebagai satu kesatuan: matrix ditulis
+        ke file baru bernama hash isinya, lalu metadata yang menunjuk file itu di-publish terakhir.
+        Generasi matrix lama dihapus setelahnya (best-effort).
+        """
+        legacy_matrix_path, meta_path = index_paths(index_path)
+        matrix = np.ascontiguousarray(normalize_rows(self.embeddings), dtype=np.float32)
+        digest = hashlib.sha256(repr(matrix.shape).encode('utf-8'))
+        digest.update(memoryview(matrix).cast('B'))
+        matrix_hash = digest.hexdigest()
+        matrix_path = matrix_file(index_path, matrix_hash)
+        meta = {
+            'version': INDEX_VERSION,
+            'count': len(self),
+            'dim': self.dim,
+            'normalized': True,
+            'tag_names': self.tag_names,
+            'tag_responses': self.tag_responses,
+            'tag_ids': self.tag_ids.tolist(),
+            'patterns': self.patterns,
+            'matrix': os.path.basename(matrix_path),
+            'matrix_sha256': matrix_hash,
+        }
+        if self.build:
+            meta['build'] = self.build
+
+        # Matrix ditulis lebih dulu; metadata terakhir menandakan index lengkap
+        if not os.path.exists(matrix_path):
+            atomic_write(matrix_path, lambda f: np.save(f, matrix))
+        atomic_write(meta_path, lambda f: json.dump(meta, f, ensure_ascii=False), mode='w')
+        self.matrix_hash = matrix_hash
+
+        for path in _matrix_generations(index_path) + [legacy_matrix_path]:
+            if os.path.abspath(path) != os.path.abspath(matrix_path) and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:  # mis. masih di-memory-map proses lain di Windows
+                    pass
+
+
+def compile_faq_json(faq_file, index_path):
+    """Konversi faq.json lama (embedding sebagai list float) menjadi index biner"""
+    with open(faq_file, 'r', encoding='utf-8') as f:
+        faq_data = json.load(f)
+    index = KnowledgeIndex.from_faq_entries(faq_data)
+    index.save(index_path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile faq.json into a memory-mapped knowledge base index")
+    parser.add_argument("faq_file", nargs="?", default="faq.json")
+    parser.add_argument("index_path", nargs="?", default="faq_index")
+    args = parser.parse_args()
+
+    index = compile_faq_json(args.faq_file, args.index_path)
+    print(f"Compiled {len(index)} entries (dim={index.dim}) into {matrix_file(args.index_path, index.matrix_hash)} "
+          f"and {index_paths(args.index_path)[1]}")
@@ -0,0 +1,146 @@
+import math
+import re
+from collections import Counter
+
+# Stop-word yang khas untuk tiap bahasa (kata yang ada di kedua bahasa sengaja tidak dimasukkan)
+STOPWORDS = {
+    'en': set("""
+        a an the is are was were be been being am do does did doing have has had having i you he she it we they
+        me him her us them my your his its our their this that these those what which who whom whose when where
+        why how can could should would will shall may might must of in on at by for with about against between
+        into through during before after above below to from up down out off over under again then once here there
+        all any both each few more most other some such no nor not only own same so than too very just and but if
+        or because as until while explain define tell give show difference differences between example examples
+        mean means work works please thanks thank hello hi
+    """.split()),
+    'id': set("""
+        apa apakah itu ini yang dan atau di ke dari dengan untuk pada dalam adalah ialah merupakan bagaimana
+        mengapa kenapa kapan dimana siapa bisa dapat tolong jelaskan jelasin sebutkan berikan beri contoh cara
+        kerja perbedaan antara saya aku kamu anda kami kita mereka dia tidak bukan belum sudah akan sedang juga
+        saja hanya lebih paling sangat banyak semua setiap beberapa tentang seperti karena jika kalau maka agar
+        supaya oleh sebagai tersebut lagi apa-apa gimana terima kasih halo hai selamat pagi siang malam mohon
+        maksud artinya arti fungsi kegunaan manfaat macam jenis apa saja buat bikin yaitu yakni bagi serta
+""".split()),
+}
+
+# Contoh teks untuk profil n-gram karakter. Istilah dari knowledge base tidak dimasukkan ke profil mana pun:
+# istilah CS juga dipakai apa adanya di kalimat Indonesia ("jelaskan binary search tree")
+SEED_TEXT = {
+    'en': """
+        what is the difference between a stack and a queue? explain how recursion works with an example.
+        can you tell me about object oriented programming? how does a computer network route packets?
+        please give me an example of a sorting algorithm. why is testing important in software development?
+        i would like to learn about databases and how they store information.
+    """,
+    'id': """
+        apa itu struktur data dan bagaimana cara kerjanya? jelaskan perbedaan antara stack dan queue.
+        tolong berikan contoh algoritma pengurutan yang sering digunakan. mengapa pengujian perangkat lunak
+        itu penting? bagaimana cara kerja jaringan komputer dalam mengirim data? saya ingin belajar tentang
+        basis data dan pemrograman berorientasi objek. apakah kamu bisa menjelaskan rekursi dengan contoh?
+        terima kasih atas penjelasannya, sangat membantu sekali. kenapa program saya error ketika dijalankan?
+        sebutkan kegunaan kecerdasan buatan dalam kehidupan sehari-hari. apa saja jenis jenis pengujian?
+    """,
+}
+
+# Rentang Unicode untuk script non-Latin: (regex, kode bahasa, confidence)
+# Script yang dipakai satu bahasa saja diberi confidence tinggi; script yang dipakai banyak bahasa rendah,
+# sehingga tetap diteruskan ke langdetect.
+SCRIPTS = [
+    (re.compile(r'[\u3040-\u30ff]'), 'ja', 0.95),   # Hiragana / Katakana
+    (re.compile(r'[\uac00-\ud7af\u1100-\u11ff]'), 'ko', 0.95),  # Hangul
+    (re.compile(r'[\u0e00-\u0e7f]'), 'th', 0.95),   # Thai
+    (re.compile(r'[\u0370-\u03ff]'), 'el', 0.95),   # Greek
+    (re.compile(r'[\u4e00-\u9fff]'), 'zh-cn', 0.7),  # Han (bisa juga Jepang)
+    (re.compile(r'[\u0400-\u04ff]'), 'ru', 0.6),    # Cyrillic (ru / uk / bg / ...)
+    (re.compile(r'[\u0600-\u06ff]'), 'ar', 0.6),    # Arabic (ar / fa / ur)
+    (re.compile(r'[\u0900-\u097f]'), 'hi', 0.6),    # Devanagari (hi / mr / ne)
+]
+
+TOKEN_RE = re.compile(r"[a-z]+(?:-[a-z]+)*")
+# Huruf Latin beraksen (é, ñ, ü, ç, ...) tidak dipakai di English maupun Indonesia
+ACCENTED_RE = re.compile(r'[\u00c0-\u024f]')
+LETTER_RE = re.compile(r'[^\W\d_]')
+# Imbuhan khas Indonesia: konfiks (meng-...-kan, di-...-i, ber-...-an, ...) atau sufiks -nya / -kan / -lah
+ID_AFFIX_RE = re.compile(r'^(?:meng|meny|mem|men|me|ber|ter|di|ke|per|pen|pem|pe)[a-z]{3,}(?:kan|an|i|nya)$'
+                         r'|^[a-z]{3,}(?:nya|kan|lah)$')
+
+
+def _char_ngrams(text, n=3):
+    text = ' ' + ' '.join(TOKEN_RE.findall(text.lower())) + ' '
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+class LocalLanguageIdentifier:
+    """
+    Identifikasi bahasa lokal yang murah, dipakai sebelum langdetect:
+    1. Script detection untuk teks non-Latin
+    2. Teks Latin: model Naive Bayes n-gram karakter + bukti stop-word untuk English vs Indonesia
+    3. Query yang hanya berisi istilah CS dari knowledge base (mis. "bst", "dll") dianggap English.
+       Istilah CS bersifat netral: tidak ikut skor n-gram, dan stop-word / imbuhan Indonesia di
+       sekitarnya ("jelaskan binary search tree") mencegah hasil English yang yakin
+    identify() mengembalikan (kode_bahasa, confidence); kode None berarti tidak yakin sama sekali.
+    """
+
+    def __init__(self, vocabulary=(), stopword_weight=5.0, ngram_size=3, smoothing=0.2):
+        self.ngram_size = ngram_size
+        self.stopword_weight = stopword_weight
+        self.vocabulary = {token for text in vocabulary for token in TOKEN_RE.findall(text.lower())}
+        self.vocabulary -= STOPWORDS['id']
+
+        # Probabilitas n-gram diinterpolasi dengan distribusi uniform (27 simbol ^ n), supaya n-gram
+        # yang tidak dikenal punya probabilitas sama di semua bahasa dan ukuran corpus tidak membuat bias
+        self._unknown = math.log(smoothing / 27 ** ngram_size)
+        self._profiles = {}
+        for lang, seed in SEED_TEXT.items():
+            counts = Counter(_char_ngrams(seed, ngram_size))
+            total = sum(counts.values())
+            self._profiles[lang] = {
+                gram: math.log((1 - smoothing) * count / total + smoothing / 27 ** ngram_size)
+                for gram, count in counts.items()
+            }
+
+    def identify(self, text):
+        """Tebak bahasa teks, mengembalikan (kode_bahasa, confidence antara 0 dan 1)"""
+        letters = LETTER_RE.findall(text)
+        if not letters:
+            return None, 0.0
+
+        for pattern, lang, confidence in SCRIPTS:
+            if len(pattern.findall(text)) / len(letters) > 0.3:
+                return lang, confidence
+
+        tokens = TOKEN_RE.findall(text.lower())
+        if not tokens:
+            return None, 0.0
+
+        # Istilah CS murni (semua token ada di vocabulary knowledge base) tidak perlu ditranslate
+        stopword_hits = {lang: sum(token in words for token in tokens) for lang, words in STOPWORDS.items()}
+        indonesian = stopword_hits['id'] > 0 or any(ID_AFFIX_RE.match(token) for token in tokens)
+        if not indonesian and all(token in self.vocabulary or token in STOPWORDS['en'] for token in tokens):
+            return 'en', 0.95
+
+        # N-gram hanya dari kata di luar vocabulary knowledge base (kecuali semuanya istilah CS)
+        general = [token for token in tokens if token not in self.vocabulary]
+        grams = _char_ngrams(' '.join(general or tokens), self.ngram_size)
+        scores = {}
+        for lang, log_probs in self._profiles.items():
+            ngram_score = sum(log_probs.get(gram, self._unknown) for gram in grams)
+            scores[lang] = ngram_score + self.stopword_weight * stopword_hits[lang]
+
+        # Softmax dari skor log menjadi probabilitas
+        best = max(scores.values())
+        exp_scores = {lang: math.exp(score - best) for lang, score in scores.items()}
+        total = sum(exp_scores.values())
+        lang = max(exp_scores, key=exp_scores.get)
+        confidence = exp_scores[lang] / total
+
+        # Bukti lemah untuk en/id: huruf beraksen, atau sebagian besar token tidak dikenal
+        # (bukan stop-word bahasa pemenang dan bukan istilah CS) -> bisa jadi bahasa lain (es, fr, de, ...)
+        known = sum(token in STOPWORDS[lang] or token in self.vocabulary for token in tokens)
+        if ACCENTED_RE.search(text):
+            confidence = min(confidence, 0.5)
+        elif lang == 'en' and indonesian:
+            confidence = min(confidence, 0.5)
+        elif known / len(tokens) < 0.5:
+            confidence = min(confidence, 0.7)
+        return lang, confidence
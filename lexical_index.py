@@ -0,0 +1,99 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+from kb_index import top_k_indices
+from language_id import STOPWORDS
+
+LEXICAL_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[+#]+)?")
+
+# Bobot tf per field: pattern dan tag lebih menentukan daripada teks response yang panjang
+FIELD_WEIGHTS = {'pattern': 2.0, 'tag': 2.0, 'responses': 1.0}
+
+
+def lexical_tokens(text, stopwords=STOPWORDS['en']):
+    """Token lowercase tanpa stop-word (istilah seperti c++, c# dan 3nf tetap utuh)"""
+    return [token for token in LEXICAL_TOKEN_RE.findall(text.lower()) if token not in stopwords]
+
+
+class BM25Index:
+    """
+    Index BM25 atas baris knowledge base (pattern + tag + responses milik baris tersebut).
+    Kontribusi BM25 setiap (term, baris) dihitung sekali saat build, sehingga query hanya
+    mengumpulkan posting list term query lalu menjumlahkannya; biaya sebanding panjang posting,
+    bukan jumlah baris.
+    """
+
+    def __init__(self, postings, n_rows):
+        self.postings = postings  # term -> (rows int64, contribution float32)
+        self.n_rows = n_rows
+
+    @classmethod
+    def from_knowledge_index(cls, kb, k1=1.2, b=0.75):
+        # Token tag dan responses dihitung sekali per tag, bukan per pattern
+        tag_tokens = []
+        for tag, responses in zip(kb.tag_names, kb.tag_responses):
+            tf = Counter()
+            for token in lexical_tokens(tag.replace('_', ' ')):
+                tf[token] += FIELD_WEIGHTS['tag']
+            for response in responses:
+                for token in lexical_tokens(response):
+                    tf[token] += FIELD_WEIGHTS['responses']
+            tag_tokens.append(tf)
+
+        rows_tf = []
+        for tag_id, pattern in zip(kb.tag_ids, kb.patterns):
+            tf = Counter(tag_tokens[tag_id])
+            for token in lexical_tokens(pattern):
+                tf[token] += FIELD_WEIGHTS['pattern']
+            rows_tf.append(tf)
+
+        lengths = np.array([sum(tf.values()) for tf in rows_tf], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 1.0
+        norms = k1 * (1 - b + b * lengths / (avg_length or 1.0))
+
+        entries = {}
+        for row, tf in enumerate(rows_tf):
+            for token, count in tf.items():
+                entries.setdefault(token, []).append((row, count))
+
+        n_rows = len(rows_tf)
+        postings = {}
+        for token, items in entries.items():
+            rows = np.fromiter((row for row, _ in items), dtype=np.int64, count=len(items))
+            tfs = np.fromiter((count for _, count in items), dtype=np.float32, count=len(items))
+            idf = math.log(1 + (n_rows - len(items) + 0.5) / (len(items) + 0.5))
+            postings[token] = (rows, (idf * tfs * (k1 + 1) / (tfs + norms[rows])).astype(np.float32))
+        return cls(postings, n_rows)
+
+    def __contains__(self, token):
+        return token in self.postings
+
+    def search(self, query, k):
+        """
+        Top-k baris untuk query. Mengembalikan (rows, scores, matched) dengan matched = fraksi
+        token query yang ada di vocabulary index.
+        """
+        tokens = list(dict.fromkeys(lexical_tokens(query)))
+        known = [token for token in tokens if token in self.postings]
+        matched = len(known) / len(tokens) if tokens else 0.0
+        if not known:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), matched
+
+        rows = np.concatenate([self.postings[token][0] for token in known])
+        contributions = np.concatenate([self.postings[token][1] for token in known])
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+        best = top_k_indices(scores, k)
+        return unique_rows[best], scores[best], matched
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Gabungkan beberapa ranking (list id, terbaik lebih dulu): skor = sum 1 / (k + rank)"""
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=lambda item: -fused[item]), fused
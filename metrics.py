@@ -0,0 +1,181 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket histogram (batas atas, inklusif). Latency dalam detik, ukuran dalam token / karakter.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+class Histogram:
+    """Histogram dengan bucket tetap (gaya Prometheus) plus estimasi quantile dari bucket"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # bucket terakhir = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Perkiraan quantile dengan interpolasi linear di dalam bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    Instrumentasi ringan untuk pipeline chatbot:
+    - span(stage): context manager yang mencatat latency stage ke histogram stage_seconds
+      dan menghitung errors_total jika stage melempar exception
+    - incr(): counter, observe(): histogram, register_callback(): nilai (gauge / counter) yang dibaca
+      dari fungsi saat export, mis. counter hit/miss milik cache
+    Export dalam format JSON (snapshot / to_json) atau Prometheus text (to_prometheus).
+    Setiap update hanya perf_counter + satu lock singkat, jadi aman dibiarkan aktif di production.
+    """
+
+    def __init__(self, namespace="edutech"):
+        self.namespace = namespace
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._callbacks = {}  # (name, labels) -> (kind, callable)
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def value(self, name, **labels):
+        """Nilai counter saat ini (0 jika belum pernah di-incr)"""
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def observe(self, name, value, buckets=SIZE_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def register_callback(self, name, fn, kind='gauge', **labels):
+        """Daftarkan fungsi tanpa argumen yang nilainya dibaca setiap kali metrics diexport"""
+        with self._lock:
+            self._callbacks[(name, _label_key(labels))] = (kind, fn)
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incr('errors_total', stage=stage)
+            raise
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, buckets=LATENCY_BUCKETS, stage=stage)
+
+    def _read_callbacks(self):
+        """Baca semua callback; mengembalikan (counters, gauges) dalam bentuk {(name, labels): value}"""
+        with self._lock:
+            callbacks = list(self._callbacks.items())
+        values = {'counter': {}, 'gauge': {}}
+        for key, (kind, fn) in callbacks:
+            try:
+                values[kind][key] = float(fn())
+            except Exception:
+                continue
+        return values['counter'], values['gauge']
+
+    def snapshot(self):
+        """Semua metrics sebagai dict yang bisa di-serialize ke JSON"""
+        callback_counters, gauges = self._read_callbacks()
+        with self._lock:
+            counters = {**self._counters, **callback_counters}
+            histograms = {key: h.snapshot() for key, h in self._histograms.items()}
+
+        def group(items):
+            grouped = {}
+            for (name, labels), value in items.items():
+                grouped.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+            return grouped
+
+        return {'counters': group(counters), 'gauges': group(gauges), 'histograms': group(histograms)}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self):
+        """Export dalam Prometheus text exposition format"""
+        callback_counters, gauges = self._read_callbacks()
+        with self._lock:
+            counters = sorted({**self._counters, **callback_counters}.items())
+            histograms = sorted(
+                ((key, h.buckets, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            metric = f"{self.namespace}_{name}"
+            declare(metric, 'counter')
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for (name, labels), value in sorted(gauges.items()):
+            metric = f"{self.namespace}_{name}"
+            declare(metric, 'gauge')
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for (name, labels), buckets, counts, total, count in histograms:
+            metric = f"{self.namespace}_{name}"
+            declare(metric, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+        return '\n'.join(lines) + '\n'
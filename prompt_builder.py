@@ -0,0 +1,229 @@
+import math
+import re
+
+from language_id import STOPWORDS
+
+# Instruksi statis untuk Gemini. Dikirim sebagai system_instruction sehingga menjadi prefix yang sama
+# di setiap request (bisa di-cache oleh Gemini), bukan disalin ulang ke setiap prompt.
+SYSTEM_INSTRUCTIONS = """You are a helpful CS (Computer Science) assistant bot. Your role is to help answer questions related to computer science concepts based ONLY on the provided context.
+
+# Notes
+1. Answer in english by default.
+2. Answer ONLY based on the provided context from the knowledge base (you must compare user input with given responses too.
+3. You can respond to greetings (hi, hello, thanks, goodbye) in a friendly way, you can also answer about who you are.
+4. For CS questions NOT covered in the context, politely say you cant recommend the topic from the course.
+6. If the similarity of context quite low, check correctly if there is a misstyping, and ask again. example: user input: abstrction, answer: do you mean ...?, if it is, then enter bla bla...
+7. If the context doesn't contain relevant information for the question, admit you don't know, and ask the question again.
+8. Please explain it further in new paragraph after, relevant to the answer.
+9. If user ask you to tell them more about the relevant context, you're allow to do it with your AI model.
+10. If user ask to recommend topic, pick some topic from the list of topic relevant to them (pick 3-5), you can ask them, which one they like most.
+11. If user ask you to make them a quiz (relevant to the topic and the context u get), do it with your AI model and format the choices with good format like the example (enter every choices).
+
+Example 1
+Questioner : Hi, I would like to ask about how does machine learning work?
+Assistant : Hi! That's a great question. Machine Learning (ML) is a subset of artificial intelligence (AI) that enables computers to learn from data and improve their performance over time without being explicitly programmed.
+
+Example 2
+Questioner : Hi, how does animal reproduce?
+Assistant : Hi, sorry for the inconvenience, sadly I can't answer your question because it is not related to Computer Science. Thank you for your patience.
+
+Example 3:
+Questioner : Hi, can you recommend me a topic?
+Assistant : Yes, i can recommend you some topic, do you prefer topic 1, topic 2, or maybe topic 3? Feel free to ask!
+
+Example 4:
+Questioner : Hi, can you make me a quiz about (topic 1)?
+Assistant : Yes, i can make a quiz for you! Here's the question: What is the correct choice about error:
+A. ...
+B. ...
+C. ...
+D. ...
+Questioner : The answer is A
+Assitant: Yes, is correct because.../ No, is wrong because..., and the correct answer is... 
+"""
+
+# Daftar topik (~250 nama) hanya dikirim jika user meminta rekomendasi topik atau quiz
+TOPIC_LIST = """
+    abstraction, error, documentation, testing, datastructure, bst, dynamic, dll, lr, dt, cm, bias, dr, dbms,
+    normal, bcnf, relation, ai, expert, rnn, supervised, hyperparameters, bn, encryption, API, cloud computing,
+    virtual reality, cybersecurity, database, programming, networking, data science, internet of things,
+    blockchain, neural networks, natural language processing, big data, DevOps, computer architecture,
+    digital logic design, javascript, react, oop, data abstraction, objects, classes, and methods,
+    constructors, destructors, operator overloading, generic programming, inheritance, multiple inheritance,
+    polymorphism, aggregation, program debugging and testing, event logging, propositional logic,
+    logical connectives, truth tables, universal quantification, existential quantification,
+    rate of growth of complexity of algorithms, asymptotic notations, time-space trade offs,
+    operations on strings, word processing, pattern matching algorithms, one-dimensional arrays,
+    multi-dimensional arrays, searching algorithms for arrays, sorting algorithms for arrays,
+    matrix multiplication, sparse matrices, stacks, queues, recursion, polish_notation, quick_sort, deques,
+    priority_queues, factorial_calculation, fibonacci_series, adders, decoders, encoders, multiplexers,
+    demultiplexers, binary_code_converters, latches_and_flip_flops, shift_registers, asynchronous_counters,
+    mealy_and_moore_machines, synchronous_counters, state_minimization_techniques, read_only_memory,
+    programmable_array_logic, programmable_logic_array, instruction_set_architecture, accumulator_based,
+    stack_based, register_memory, register_register, instruction_encoding, computer_performance,
+    common_pitfalls, amdahls_law, memory_hierarchy, cache_memory, bus_standards, arbitration_schemes,
+    programmed_io, interrupt_driven_io, direct_memory_access, cap_theorem, distributed_databases,
+    decision_support_systems, data_warehousing, instruction_level_parallelism, pipeline_hazards,
+    data_level_parallelism, branch_prediction, multiple_issue_architectures, software_process_models,
+    requirements_engineering_process, planning_and_scheduling, risk_management, software_quality_assurance,
+    cocomo_model, software_maintenance, osi_reference_model, tcp_ip_reference_model,
+    software_defined_networking, virtual_network_functions, ip_addressing, ip_subnetting, network_routing,
+    computational_intelligence, searching_methodologies, first_order_logic, genetic_algorithms,
+    evolutionary_strategies, kernels, processes, threads, deadlock, scheduling_algorithms, memory_management,
+    secondary_storage_management, file_management, io_management, disk_scheduling, internal_bus_architecture,
+    pin_functions, memory_addressing_schemes, bus_buffering, bus_cycles, clock_generation_circuit,
+    reset_circuit, memory_interfacing, basic_io_interface, programmable_peripheral_interface,
+    programmable_interval_timer, hardware_interrupts, programmable_interrupt_controller, dma_operations,
+    training_vs_testing, theory_of_generalization, vc_dimension, generalization_bounds, bias_variance_tradeoff,
+    stochastic_gradient_descent, backpropagation_algorithm, cs_html_basics, cs_css_basics, cs_http_methods,
+    cs_rest_api, cs_garbage_collection, cs_concurrency_vs_parallelism, cs_solid_principles, cs_compiler_phases,
+    cs_sql_joins, cs_acid_properties, cs_docker_basics, cs_kubernetes_basics, cs_git_basics,
+    cs_agile_methodology, cs_scrum_framework, cs_machine_learning_overview, cs_deep_learning_overview,
+    cs_data_mining, cs_firewall, cs_vpn
+"""
+
+TOPIC_REQUEST_RE = re.compile(
+    r'\b(recommend\w*|suggest\w*|topics?|quiz\w*|rekomendasi\w*|saran\w*|topik|kuis|materi)\b', re.IGNORECASE
+)
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Perkiraan rata-rata karakter per token untuk teks English di tokenizer Gemini
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Perkiraan jumlah token (tanpa network call ke count_tokens)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Potong teks di batas kata supaya kira-kira muat dalam max_tokens"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(' ', 1)[0]
+    return cut + '...'
+
+
+def _content_words(text):
+    return {word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS['en']}
+
+
+class PromptBuilder:
+    """
+    Penyusun prompt Gemini dengan budget token eksplisit:
+    - Instruksi statis menjadi system_instruction (prefix tetap yang reusable)
+    - Context dideduplikasi per tag; response tiap tag hanya dikirim sekali, dan kalimatnya dipilih
+      berdasarkan relevansi terhadap query sampai budget context habis
+    - History dipotong per giliran dan total, giliran terbaru diprioritaskan
+    - Daftar topik hanya disertakan jika user meminta rekomendasi/quiz
+    build() mengembalikan prompt beserta laporan jumlah token per bagian.
+    """
+
+    def __init__(self, system_instructions=SYSTEM_INSTRUCTIONS, topic_list=TOPIC_LIST, max_context_tokens=700,
+                 max_history_tokens=500, history_turn_tokens=150, min_topic_tokens=60):
+        self.system_instruction = system_instructions
+        self.topic_list = ' '.join(topic_list.split())
+        self.max_context_tokens = max_context_tokens
+        self.max_history_tokens = max_history_tokens
+        self.history_turn_tokens = history_turn_tokens
+        self.min_topic_tokens = min_topic_tokens
+        self.system_tokens = estimate_tokens(self.system_instruction)
+
+    @staticmethod
+    def dedupe_contexts(contexts):
+        """Gabungkan context dengan tag yang sama; urutan dan skor mengikuti pattern dengan similarity tertinggi"""
+        merged = {}
+        for ctx in contexts:
+            entry = merged.get(ctx['tag'])
+            if entry is None:
+                merged[ctx['tag']] = {**ctx, 'responses': list(ctx['responses'])}
+            else:
+                entry['responses'].extend(r for r in ctx['responses'] if r not in entry['responses'])
+        return list(merged.values())
+
+    def select_sentences(self, responses, query, max_tokens):
+        """
+        Pilih kalimat response yang paling relevan dengan query (overlap kata penting, kalimat pertama
+        diberi bonus karena biasanya definisi), lalu kembalikan dalam urutan aslinya.
+        """
+        sentences = list(dict.fromkeys(
+            sentence.strip() for response in responses for sentence in SENTENCE_RE.split(response) if sentence.strip()
+        ))
+        query_words = _content_words(query)
+        ranked = sorted(
+            range(len(sentences)),
+            key=lambda i: (len(query_words & _content_words(sentences[i])) + (1.5 if i == 0 else 0), -i),
+            reverse=True,
+        )
+
+        chosen, used = [], 0
+        for i in ranked:
+            cost = estimate_tokens(sentences[i])
+            if chosen and used + cost > max_tokens:
+                continue
+            chosen.append(i)
+            used += cost
+        text = ' '.join(sentences[i] for i in sorted(chosen))
+        return truncate_to_tokens(text, max_tokens)
+
+    def format_context(self, contexts, query=''):
+        """Format context (sudah dideduplikasi per tag) dalam batas max_context_tokens"""
+        topics = self.dedupe_contexts(contexts)
+        if not topics:
+            return "No relevant context found."
+
+        per_topic = max(self.max_context_tokens // len(topics), self.min_topic_tokens)
+        lines, used = ["KNOWLEDGE BASE CONTEXT:"], 0
+        for i, ctx in enumerate(topics, 1):
+            budget = min(per_topic, self.max_context_tokens - used)
+            if budget < self.min_topic_tokens and i > 1:
+                break
+            block = (
+                f"\n{i}. Topic: {ctx['tag']}\n"
+                f"   Question Pattern: {ctx['pattern']}\n"
+                f"   Responses: {self.select_sentences(ctx['responses'], query, budget)}\n"
+                f"   Relevance Score: {ctx['similarity']:.4f}"
+            )
+            lines.append(block)
+            used += estimate_tokens(block)
+        return '\n'.join(lines)
+
+    def format_history(self, history):
+        """Format chat history: setiap giliran dipotong, giliran terbaru dipertahankan sampai budget habis"""
+        if not history:
+            return ""
+        turns, used = [], 0
+        for h in reversed(history):
+            turn = (f"User: {truncate_to_tokens(h['user'], self.history_turn_tokens)}\n"
+                    f"Assistant: {truncate_to_tokens(h['assistant'], self.history_turn_tokens)}")
+            cost = estimate_tokens(turn)
+            if turns and used + cost > self.max_history_tokens:
+                break
+            turns.append(turn)
+            used += cost
+        return "\nCHAT HISTORY:\n" + '\n\n'.join(reversed(turns))
+
+    def wants_topic_list(self, *queries):
+        return any(TOPIC_REQUEST_RE.search(q) for q in queries if q)
+
+    def build(self, user_query, english_query, contexts, history_text):
+        """Susun prompt per request (tanpa instruksi statis) dan laporan jumlah token"""
+        context_text = self.format_context(contexts, english_query)
+        topic_text = f"List of topic: {self.topic_list}" if self.wants_topic_list(user_query, english_query) else ""
+        lang_instruction = f"IMPORTANT: Respond ONLY in the same language as this original user question: '{user_query}'. Do not provide multiple language versions or translations."
+        question = f"Current User Question: {user_query}"
+
+        sections = [topic_text, context_text, history_text, lang_instruction, question]
+        prompt = '\n\n'.join(section for section in sections if section) + '\n'
+
+        tokens = {
+            'system': self.system_tokens,
+            'topics': estimate_tokens(topic_text),
+            'context': estimate_tokens(context_text),
+            'history': estimate_tokens(history_text),
+            'prompt': estimate_tokens(prompt),
+        }
+        tokens['total'] = tokens['system'] + tokens['prompt']
+        return prompt, tokens
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Session yang dipakai jika pemanggil tidak memberi session_id (mis. mode CLI / notebook)
+DEFAULT_SESSION = "default"
+
+
+class ConversationStore:
+    """
+    Chat history per session_id, terpisah dari bagian RAGChatbot yang di-share (model, index, client Gemini).
+    - Setiap session menyimpan maksimal max_history giliran (deque dengan maxlen)
+    - Jumlah session dibatasi max_sessions (session paling lama tidak aktif dibuang lebih dulu)
+    - Session yang idle lebih lama dari idle_ttl detik dibuang
+    Lock hanya dipegang untuk operasi dict O(1), tidak selama memanggil model.
+    """
+
+    def __init__(self, max_history=10, max_sessions=1000, idle_ttl=3600):
+        self.max_history = max_history
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()  # session_id -> (deque history, last_used)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        """Buang session idle dan session tertua jika melebihi max_sessions (lock harus sudah dipegang)"""
+        if self.idle_ttl is not None:
+            while self._sessions:
+                session_id, (_, last_used) = next(iter(self._sessions.items()))
+                if last_used + self.idle_ttl > now:
+                    break
+                del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, session_id=DEFAULT_SESSION):
+        """Snapshot history sebuah session (list of {'user', 'assistant'}), urut dari yang paling lama"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            item = self._sessions.get(session_id)
+            if item is None:
+                return []
+            self._sessions[session_id] = (item[0], now)
+            self._sessions.move_to_end(session_id)
+            return list(item[0])
+
+    def append(self, session_id, user, assistant):
+        """Tambahkan satu giliran percakapan; history otomatis dibatasi max_history"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._sessions.get(session_id)
+            history = item[0] if item is not None else deque(maxlen=self.max_history)
+            history.append({'user': user, 'assistant': assistant})
+            self._sessions[session_id] = (history, now)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def clear(self, session_id=DEFAULT_SESSION):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
@@ -0,0 +1,184 @@
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+BOT_NAME = "CS Helper"
+
+# Frasa small talk per intent dan bahasa. Pesan dicocokkan utuh setelah normalize_message, jadi
+# "hi, what is bcnf?" tetap diteruskan ke pipeline RAG. Frasa yang sama di dua bahasa: yang pertama menang
+SMALL_TALK_PATTERNS = {
+    'greeting': {
+        'en': ['hi', 'hii', 'hello', 'hey', 'hiya', 'yo', 'greetings', 'good morning', 'good afternoon',
+               'good evening'],
+        'id': ['hai', 'halo', 'hallo', 'hei', 'permisi', 'selamat pagi', 'selamat siang', 'selamat sore',
+               'selamat malam', 'pagi', 'siang', 'sore', 'assalamualaikum'],
+        'es': ['hola', 'buenos dias', 'buenas tardes', 'buenas noches'],
+        'fr': ['bonjour', 'salut', 'bonsoir'],
+        'de': ['guten morgen', 'guten tag', 'guten abend'],
+        'ja': ['こんにちは', 'おはよう', 'こんばんは'],
+        'zh-cn': ['你好', '您好'],
+        'ko': ['안녕하세요', '안녕'],
+    },
+    'thanks': {
+        'en': ['thanks', 'thank you', 'thx', 'ty', 'cheers', 'many thanks', 'thanks a lot', 'thank you so much',
+               'thank you very much', 'ok thanks', 'okay thanks', 'ok thank you'],
+        'id': ['terima kasih', 'terimakasih', 'makasih', 'makasi', 'trims', 'tengkyu', 'terima kasih banyak',
+               'makasih banyak', 'oke makasih', 'ok makasih', 'oke terima kasih', 'ok terima kasih'],
+        'es': ['gracias', 'muchas gracias'],
+        'fr': ['merci', 'merci beaucoup'],
+        'de': ['danke', 'danke schon', 'vielen dank'],
+        'ja': ['ありがとう', 'ありがとうございます'],
+        'zh-cn': ['谢谢'],
+        'ko': ['감사합니다', '고마워'],
+    },
+    'goodbye': {
+        'en': ['bye', 'bye bye', 'goodbye', 'good bye', 'see you', 'see ya', 'see you later', 'good night'],
+        'id': ['dadah', 'dah', 'sampai jumpa', 'sampai nanti', 'selamat tinggal', 'duluan'],
+        'es': ['adios', 'hasta luego'],
+        'fr': ['au revoir'],
+        'de': ['tschuss', 'auf wiedersehen'],
+        'ja': ['さようなら'],
+        'zh-cn': ['再见'],
+    },
+    'identity': {
+        'en': ['who are you', 'what are you', 'what is your name', 'whats your name', 'are you a bot',
+               'are you human', 'are you an ai', 'introduce yourself'],
+        'id': ['siapa kamu', 'kamu siapa', 'siapa anda', 'anda siapa', 'siapa namamu', 'nama kamu siapa',
+               'kamu bot', 'kamu robot', 'perkenalkan dirimu', 'perkenalkan diri kamu'],
+    },
+    'capabilities': {
+        'en': ['help', 'what can you do', 'how can you help', 'how can you help me', 'what do you know'],
+        'id': ['bantuan', 'kamu bisa apa', 'bisa bantu apa', 'apa yang bisa kamu lakukan', 'bisa apa saja'],
+    },
+    'acknowledgement': {
+        'en': ['ok', 'okay', 'cool', 'nice', 'great', 'got it', 'i see', 'alright'],
+        'id': ['oke', 'sip', 'siap', 'mantap', 'baik', 'paham', 'oh begitu', 'oke deh', 'ok deh'],
+    },
+}
+
+# Template jawaban; bahasa yang tidak ada di sini memakai versi English yang ditranslate oleh chatbot
+SMALL_TALK_REPLIES = {
+    'greeting': {
+        'en': "Hi! 👋 I'm {bot_name}, your Computer Science learning assistant. Ask me about any CS topic, "
+              "for example data structures, databases or computer networks.",
+        'id': "Halo! 👋 Saya {bot_name}, asisten belajar Computer Science kamu. Tanyakan topik CS apa saja, "
+              "misalnya struktur data, database atau jaringan komputer.",
+    },
+    'thanks': {
+        'en': "You're welcome! Let me know if you have another Computer Science question.",
+        'id': "Sama-sama! Kalau ada pertanyaan Computer Science lain, tanyakan saja ya.",
+    },
+    'goodbye': {
+        'en': "Goodbye and happy learning! Come back anytime you have a CS question.",
+        'id': "Sampai jumpa, selamat belajar! Kembali lagi kapan saja kalau ada pertanyaan seputar CS.",
+    },
+    'identity': {
+        'en': "I'm {bot_name}, an AI assistant for the EduTech Computer Science courses. I answer your questions "
+              "from the course knowledge base, in your own language.",
+        'id': "Saya {bot_name}, asisten AI untuk materi Computer Science di EduTech. Saya menjawab pertanyaan "
+              "berdasarkan knowledge base materi kursus, dalam bahasa kamu.",
+    },
+    'capabilities': {
+        'en': "I can explain Computer Science concepts from the course material, compare topics, give examples "
+              "and even make a short quiz. Try asking: \"What is data abstraction?\"",
+        'id': "Saya bisa menjelaskan konsep Computer Science dari materi kursus, membandingkan topik, memberi "
+              "contoh, bahkan membuat kuis singkat. Coba tanya: \"Apa itu data abstraction?\"",
+    },
+    'acknowledgement': {
+        'en': "Great! Feel free to ask another Computer Science question anytime.",
+        'id': "Siap! Silakan tanya topik Computer Science lainnya kapan saja.",
+    },
+}
+
+# Intent yang maknanya bergantung pada percakapan: "ok" / "siap" bisa menjawab pertanyaan bot sebelumnya
+# ("Maksud kamu abstraction? balas ok") atau lanjut kuis, jadi hanya dijawab template jika belum ada history
+CONTEXTUAL_INTENTS = frozenset({'acknowledgement'})
+
+# Sapaan / panggilan yang boleh menempel pada small talk ("hi bot", "makasih kak", "thanks guys")
+FILLER_WORDS = frozenset({
+    'bot', 'there', 'guys', 'all', 'everyone', 'friend', 'buddy', 'sir', 'assistant', 'helper', 'cs',
+    'kak', 'min', 'admin', 'ya', 'yah', 'yaa', 'dong', 'deh', 'nih', 'bang', 'mas', 'mbak',
+})
+WORD_RE = re.compile(r"[^\W\d_]+")
+# Huruf yang diulang 3x atau lebih ("hiiii", "thanksss") diringkas menjadi satu
+REPEAT_RE = re.compile(r"([^\W\d_])\1{2,}")
+
+
+def normalize_message(text):
+    """Lowercase, buang aksen dan tanda baca/emoji, ringkas huruf berulang, hapus kata sapaan pengisi"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = unicodedata.normalize('NFKC', ''.join(ch for ch in text if not unicodedata.combining(ch)))
+    text = REPEAT_RE.sub(r"\1", text)
+    words = WORD_RE.findall(text)
+    kept = [word for word in words if word not in FILLER_WORDS]
+    return ' '.join(kept or words)
+
+
+class SmallTalkRouter:
+    """
+    Router lokal untuk sapaan dan small talk di depan pipeline RAG (tanpa translate, search dan Gemini):
+    1. Frasa: pesan pendek yang setelah normalize_message sama persis dengan frasa di SMALL_TALK_PATTERNS.
+       Bahasa jawaban mengikuti bahasa frasa, jadi tidak perlu deteksi bahasa
+    2. Embedding (jika encode_fn diberikan): variasi frasa yang semua katanya kosakata small talk
+       ("thank you so much bot", "hello good morning") dibandingkan dengan semua frasa, dipakai jika
+       cosine >= threshold. Pesan lain (mis. "apa itu rekursi") tidak pernah di-encode di sini
+    route(text, in_conversation) mengembalikan (intent, lang, score), atau None jika pesan harus diteruskan
+    apa adanya. Di tengah percakapan, intent di CONTEXTUAL_INTENTS selalu diteruskan.
+    """
+
+    def __init__(self, patterns=SMALL_TALK_PATTERNS, replies=SMALL_TALK_REPLIES, encode_fn=None, threshold=0.85,
+                 max_words=6, bot_name=BOT_NAME):
+        self.replies = replies
+        self.encode_fn = encode_fn
+        self.threshold = threshold
+        self.max_words = max_words
+        self.bot_name = bot_name
+
+        self.phrases = {}  # frasa ternormalisasi -> (intent, lang)
+        for intent, by_lang in patterns.items():
+            for lang, phrases in by_lang.items():
+                for phrase in phrases:
+                    self.phrases.setdefault(normalize_message(phrase), (intent, lang))
+        self.small_talk_words = {word for phrase in self.phrases for word in phrase.split()}
+        self._examples = None  # (embeddings, labels), di-encode saat pertama kali dibutuhkan
+        self._lock = threading.Lock()
+
+    def _example_embeddings(self):
+        if self._examples is None:
+            with self._lock:
+                if self._examples is None:
+                    phrases = list(self.phrases)
+                    self._examples = (np.asarray(self.encode_fn(phrases), dtype=np.float32),
+                                      [self.phrases[phrase] for phrase in phrases])
+        return self._examples
+
+    def route(self, text, in_conversation=False):
+        normalized = normalize_message(text)
+        words = normalized.split()
+        if not words or len(words) > self.max_words:
+            return None
+
+        match = self.phrases.get(normalized)
+        if match is not None:
+            if in_conversation and match[0] in CONTEXTUAL_INTENTS:
+                return None
+            return match[0], match[1], 1.0
+
+        if self.encode_fn is None or not all(word in self.small_talk_words for word in words):
+            return None
+        embeddings, labels = self._example_embeddings()
+        scores = embeddings @ np.asarray(self.encode_fn([text])[0], dtype=np.float32)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        intent, lang = labels[best]
+        if in_conversation and intent in CONTEXTUAL_INTENTS:
+            return None
+        return intent, lang, float(scores[best])
+
+    def reply(self, intent, lang='en'):
+        """Template jawaban untuk intent dalam bahasa lang, atau None jika belum ada terjemahannya"""
+        template = self.replies.get(intent, {}).get(lang)
+        return template.format(bot_name=self.bot_name) if template is not None else None
@@ -0,0 +1,178 @@
+import itertools
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from caches import LRUCache, SemanticCache, TranslationCache
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_ttl_expiry_counts_as_miss(self):
+        cache = LRUCache(maxsize=4, ttl=10)
+        with mock.patch('caches.time.monotonic', return_value=100.0):
+            cache.put('a', 1)
+        with mock.patch('caches.time.monotonic', return_value=109.0):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('caches.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(len(cache), 0)
+
+
+class SemanticCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, 'answers.sqlite3')
+
+    def open_cache(self, **kwargs):
+        cache = SemanticCache(db_path=self.db_path, **kwargs)
+        if cache._db is not None:
+            self.addCleanup(cache._db.close)
+        return cache
+
+    def test_similar_query_hits_and_dissimilar_misses(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.store(unit(1, 0, 0), ['tag'], 'en', 'answer')
+        self.assertEqual(cache.lookup(unit(1, 0.1, 0), ['tag'], 'en'), 'answer')
+        self.assertIsNone(cache.lookup(unit(0, 1, 0), ['tag'], 'en'))
+        self.assertIsNone(cache.lookup(unit(1, 0, 0), ['other'], 'en'))
+        self.assertIsNone(cache.lookup(unit(1, 0, 0), ['tag'], 'id'))
+
+    def test_none_key_matches_only_exact_entries(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.store(None, ['tag'], 'en', 'exact answer')
+        self.assertEqual(cache.lookup(None, ['tag'], 'en'), 'exact answer')
+        self.assertIsNone(cache.lookup(None, ['tag'], 'id'))
+        self.assertIsNone(cache.lookup(unit(1, 0, 0), ['tag'], 'en'))
+
+        cache.store(unit(1, 0, 0), ['dense'], 'en', 'dense answer')
+        self.assertIsNone(cache.lookup(None, ['dense'], 'en'))
+
+    def test_ttl_expiry(self):
+        cache = SemanticCache(ttl=60)
+        with mock.patch('caches.time.time', return_value=1000.0):
+            cache.store(None, ['tag'], 'en', 'answer')
+        with mock.patch('caches.time.time', return_value=1059.0):
+            self.assertEqual(cache.lookup(None, ['tag'], 'en'), 'answer')
+        with mock.patch('caches.time.time', return_value=1061.0):
+            self.assertIsNone(cache.lookup(None, ['tag'], 'en'))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = SemanticCache(maxsize=2)
+        cache.store(None, ['a'], 'en', 'A')
+        cache.store(None, ['b'], 'en', 'B')
+        cache.lookup(None, ['a'], 'en')
+        cache.store(None, ['c'], 'en', 'C')
+        self.assertEqual(cache.lookup(None, ['a'], 'en'), 'A')
+        self.assertIsNone(cache.lookup(None, ['b'], 'en'))
+        self.assertEqual(len(cache), 2)
+
+    def test_persists_across_instances(self):
+        cache = self.open_cache(model_fingerprint='m1')
+        cache.store(unit(1, 0, 0), ['tag'], 'en', 'dense answer')
+        cache.store(None, ['tag'], 'en', 'exact answer')
+
+        reloaded = self.open_cache(model_fingerprint='m1')
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual(reloaded.lookup(unit(1, 0, 0), ['tag'], 'en'), 'dense answer')
+        self.assertEqual(reloaded.lookup(None, ['tag'], 'en'), 'exact answer')
+
+    def test_load_drops_other_models_and_trims_to_maxsize(self):
+        cache = self.open_cache(model_fingerprint='old')
+        cache.store(None, ['stale'], 'en', 'stale')
+
+        cache = self.open_cache(model_fingerprint='new')
+        self.assertEqual(len(cache), 0)
+        clock = itertools.count(1000.0)
+        with mock.patch('caches.time.time', side_effect=lambda: next(clock)):
+            for tag in 'abcde':
+                cache.store(None, [tag], 'en', tag.upper())
+
+        trimmed = self.open_cache(model_fingerprint='new', maxsize=2)
+        self.assertEqual(len(trimmed), 2)
+        self.assertEqual(trimmed.lookup(None, ['e'], 'en'), 'E')
+        self.assertIsNone(trimmed.lookup(None, ['a'], 'en'))
+        rows = trimmed._db.execute("SELECT COUNT(*) FROM semantic_cache").fetchone()[0]
+        self.assertEqual(rows, 2)
+
+
+class TranslationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, 'translations.sqlite3')
+
+    def open_cache(self, **kwargs):
+        cache = TranslationCache(db_path=self.db_path, **kwargs)
+        if cache._db is not None:
+            self.addCleanup(cache._db.close)
+        return cache
+
+    def test_memory_hit_uses_normalized_text(self):
+        cache = TranslationCache(memory_size=4)
+        cache.put('id', 'en', 'Apa itu  Python?', 'What is Python?')
+        self.assertEqual(cache.get('id', 'en', ' apa itu python? '), 'What is Python?')
+        self.assertIsNone(cache.get('en', 'id', 'apa itu python?'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_persists_across_instances(self):
+        self.open_cache().put('id', 'en', 'halo', 'hello')
+        reloaded = self.open_cache()
+        self.assertEqual(reloaded.get('id', 'en', 'halo'), 'hello')
+        self.assertEqual(reloaded.stats()['disk_hits'], 1)
+        # Hit dari disk dipromosikan ke memory
+        self.assertEqual(reloaded.get('id', 'en', 'halo'), 'hello')
+        self.assertEqual(reloaded.stats()['memory_hits'], 1)
+
+    def test_trims_least_recently_used_disk_entries(self):
+        cache = self.open_cache(memory_size=0, disk_size=10)
+        clock = itertools.count(1000.0)
+        with mock.patch('caches.time.time', side_effect=lambda: next(clock)):
+            for i in range(10):
+                cache.put('id', 'en', f'text {i}', f'translated {i}')
+            self.assertEqual(cache.get('id', 'en', 'text 0'), 'translated 0')
+            cache.put('id', 'en', 'text 10', 'translated 10')
+
+        self.assertLessEqual(cache.stats()['disk_size'], 10)
+        self.assertEqual(cache.get('id', 'en', 'text 0'), 'translated 0')
+        self.assertIsNone(cache.get('id', 'en', 'text 1'))
+        self.assertEqual(cache.get('id', 'en', 'text 10'), 'translated 10')
+
+    def test_replacing_existing_keys_does_not_trim(self):
+        cache = self.open_cache(memory_size=0, disk_size=10)
+        for i in range(10):
+            cache.put('id', 'en', f'text {i}', f'translated {i}')
+        for i in range(10):
+            cache.put('id', 'en', f'text {i}', f'updated {i}')
+        self.assertEqual(cache.stats()['disk_size'], 10)
+        self.assertEqual(cache.get('id', 'en', 'text 0'), 'updated 0')
+
+    def test_unavailable_database_falls_back_to_memory(self):
+        with self.assertLogs('caches', level='WARNING'):
+            cache = TranslationCache(db_path=os.path.join(self.tmpdir.name, 'missing', 'cache.sqlite3'))
+        cache.put('id', 'en', 'halo', 'hello')
+        self.assertEqual(cache.get('id', 'en', 'halo'), 'hello')
+
+
+if __name__ == '__main__':
+    unittest.main()
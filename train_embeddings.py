@@ -0,0 +1,325 @@
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import time
+
+import numpy as np
+
+from benchmark import retrieval_metrics
+from build_kb import build_index, encode_texts, load_intents, model_fingerprint, remove_stale_ann
+from encoders import ONNX_DIR, export_onnx
+from kb_index import KnowledgeIndex, build_tag_table, index_exists, preprocess_text
+
+DEFAULT_BASE_MODEL = 'all-MiniLM-L6-v2'
+
+
+def split_holdout(entries, fraction=0.15, seed=42):
+    """
+    Pisahkan pattern untuk evaluasi: dari tag yang punya >= 2 pattern, satu pattern per tag dijadikan
+    query held-out (maksimal fraction x jumlah entry). Tag tetap punya pattern di data training.
+    Mengembalikan (train_entries, holdout_entries).
+    """
+    rng = random.Random(seed)
+    by_tag = {}
+    for i, entry in enumerate(entries):
+        by_tag.setdefault(entry['tag'], []).append(i)
+
+    candidates = [rows for rows in by_tag.values() if len(rows) >= 2]
+    rng.shuffle(candidates)
+    limit = int(len(entries) * fraction)
+    holdout = {rng.choice(rows) for rows in candidates[:limit]}
+    return ([entry for i, entry in enumerate(entries) if i not in holdout],
+            [entry for i, entry in enumerate(entries) if i in holdout])
+
+
+def training_pairs(texts, tags, rng):
+    """
+    Pasangan (anchor_row, positive_text) linear dalam jumlah pattern: setiap pattern dipasangkan dengan
+    satu pattern lain dari tag yang sama (dipilih acak ulang tiap epoch), bukan semua kombinasi O(n^2).
+    Tag dengan satu pattern memakai nama tag sebagai positive.
+    """
+    by_tag = {}
+    for row, tag in enumerate(tags):
+        by_tag.setdefault(tag, []).append(row)
+
+    pairs = []
+    for tag, rows in by_tag.items():
+        if len(rows) == 1:
+            pairs.append((rows[0], preprocess_text(tag.replace('_', ' '))))
+            continue
+        for i, row in enumerate(rows):
+            j = rng.randrange(len(rows) - 1)
+            pairs.append((row, texts[rows[j + (j >= i)]]))
+    return pairs
+
+
+def mine_hard_negatives(texts, tags, embeddings, rng, max_similarity=0.9, block_size=1024):
+    """
+    Untuk setiap teks, pattern dari tag lain yang paling mirip (embedding dari index / model saat ini).
+    Kandidat di atas max_similarity dilewati karena kemungkinan besar parafrase (false negative).
+    Teks tanpa kandidat mendapat pattern acak dari tag lain. Mengembalikan list (text, tag) negatif.
+    """
+    tag_ids, _, _ = build_tag_table((tag, ()) for tag in tags)
+    negatives = []
+    for start in range(0, len(texts), block_size):
+        scores = embeddings[start:start + block_size] @ embeddings.T
+        invalid = (tag_ids[start:start + block_size, None] == tag_ids[None, :]) | (scores > max_similarity)
+        scores = np.where(invalid, -np.inf, scores)
+        for row, best in enumerate(np.argmax(scores, axis=1)):
+            if not np.isfinite(scores[row, best]):
+                others = [i for i, tag_id in enumerate(tag_ids) if tag_id != tag_ids[start + row]]
+                best = rng.choice(others) if others else start + row
+            negatives.append((texts[best], tags[best]))
+    return negatives
+
+
+def unique_tag_batches(examples, example_tags, batch_size, rng):
+    """
+    Susun batch sehingga tidak ada dua contoh dengan tag yang sama (termasuk tag hard negative) dalam
+    satu batch: dengan in-batch negatives, positive contoh lain di batch menjadi negative, jadi tag
+    yang sama akan menjadi false negative.
+    """
+    order = list(range(len(examples)))
+    rng.shuffle(order)
+    batches, batch_tags = [], []
+    for i in order:
+        tags = example_tags[i]
+        for batch, used in zip(batches, batch_tags):
+            if len(batch) < batch_size and used.isdisjoint(tags):
+                batch.append(examples[i])
+                used.update(tags)
+                break
+        else:
+            batches.append([examples[i]])
+            batch_tags.append(set(tags))
+    rng.shuffle(batches)
+    return [batch for batch in batches if len(batch) > 1]
+
+
+def evaluate_retrieval(model, queries, corpus, k=5, batch_size=256):
+    """
+    Retrieval held-out: setiap query dicari di antara pattern training, hasilnya digabung per tag (max).
+    Mengembalikan recall@1, recall@k dan MRR (rank tag yang benar).
+    """
+    corpus_index = KnowledgeIndex(
+        encode_texts(model, [preprocess_text(entry['pattern']) for entry in corpus], batch_size=batch_size),
+        *_tag_columns(corpus),
+    )
+    query_embeddings = encode_texts(model, [preprocess_text(entry['pattern']) for entry in queries], batch_size=batch_size)
+    indices, scores = corpus_index.search(query_embeddings, len(corpus_index))
+
+    ranks = []
+    for entry, row_indices, row_scores in zip(queries, indices, scores):
+        tag_ids, _, _, _ = corpus_index.aggregate_tags(row_indices, row_scores, corpus_index.n_tags)
+        ranked = [corpus_index.tag_names[tag_id] for tag_id in tag_ids]
+        ranks.append(ranked.index(entry['tag']) + 1 if entry['tag'] in ranked else None)
+    return retrieval_metrics(ranks, k)
+
+
+def _tag_columns(entries):
+    tag_ids, tag_names, tag_responses = build_tag_table((entry['tag'], entry['responses']) for entry in entries)
+    return tag_ids, [entry['pattern'] for entry in entries], tag_names, tag_responses
+
+
+def _initial_embeddings(model, base_path, entries, index_path, batch_size):
+    """Embedding pattern training untuk mining pertama: dipakai ulang dari index jika dibuat dengan model yang sama"""
+    previous = None
+    if index_path and index_exists(index_path):
+        try:
+            previous = KnowledgeIndex.load(index_path)
+        except (OSError, ValueError, KeyError, json.JSONDecodeError):
+            previous = None
+    index, stats = build_index(entries, base_path, previous=previous,
+                               encode_fn=lambda texts: encode_texts(model, texts, batch_size=batch_size))
+    return np.asarray(index.embeddings, dtype=np.float32), stats['reused']
+
+
+def train(entries, base_model, output_path, index_path=None, epochs=10, patience=2, batch_size=32, lr=2e-5,
+          warmup_ratio=0.1, holdout=0.15, hard_negatives=True, max_negative_similarity=0.9, max_seq_length=64,
+          k=5, seed=42, log=print):
+    """
+    Fine-tune model embedding dengan MultipleNegativesRankingLoss (in-batch negatives + hard negative),
+    evaluasi retrieval held-out setiap epoch, dan early stopping (patience epoch tanpa kenaikan MRR).
+    Checkpoint terbaik disimpan ke output_path; model tidak ditimpa jika tidak ada epoch yang lebih baik
+    dari baseline. Mengembalikan dict laporan (baseline, history, best_epoch).
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, losses
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    rng = random.Random(seed)
+
+    model = SentenceTransformer(base_model, device='cpu')
+    # max_seq_length pendek hanya untuk training (pattern FAQ pendek); model yang disimpan tetap memakai
+    # panjang aslinya supaya encoding di production dan export ONNX tidak ikut terpotong
+    deployed_max_seq_length = model.max_seq_length
+    training_max_seq_length = min(model.max_seq_length or max_seq_length, max_seq_length)
+    model.max_seq_length = training_max_seq_length
+    train_entries, holdout_entries = split_holdout(entries, holdout, seed)
+    log(f"{len(train_entries)} training patterns, {len(holdout_entries)} held-out queries")
+
+    baseline = evaluate_retrieval(model, holdout_entries, train_entries, k)
+    log(f"epoch 0 (baseline): {json.dumps(baseline)}")
+
+    texts = [preprocess_text(entry['pattern']) for entry in train_entries]
+    tags = [entry['tag'] for entry in train_entries]
+    embeddings = None
+    if hard_negatives:
+        # Mining pertama memakai embedding index yang ada; epoch berikutnya memakai model yang sedang dilatih
+        embeddings, reused = _initial_embeddings(model, base_model, train_entries, index_path, batch_size)
+        log(f"Hard negatives mined from {reused} index rows and {len(train_entries) - reused} new encodings")
+
+    loss_fn = losses.MultipleNegativesRankingLoss(model)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=0.01)
+    steps_per_epoch = math.ceil(len(train_entries) / batch_size)
+    total_steps = max(steps_per_epoch * epochs, 1)
+    warmup_steps = int(total_steps * warmup_ratio)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lambda step: min(
+        (step + 1) / max(warmup_steps, 1), max(0.0, (total_steps - step) / max(total_steps - warmup_steps, 1))))
+
+    staging_path = output_path.rstrip('/\\') + '.training'
+    best = {'epoch': 0, 'metrics': baseline}
+    history, stale_epochs = [], 0
+    for epoch in range(1, epochs + 1):
+        start = time.perf_counter()
+        pairs = training_pairs(texts, tags, rng)
+        if hard_negatives:
+            negatives = mine_hard_negatives(texts, tags, embeddings, rng, max_negative_similarity)
+            examples = [(texts[row], positive, negatives[row][0]) for row, positive in pairs]
+            example_tags = [(tags[row], negatives[row][1]) for row, _ in pairs]
+        else:
+            examples = [(texts[row], positive) for row, positive in pairs]
+            example_tags = [(tags[row],) for row, _ in pairs]
+
+        model.train()
+        losses_seen = []
+        for batch in unique_tag_batches(examples, example_tags, batch_size, rng):
+            features = [model.tokenize(list(column)) for column in zip(*batch)]
+            loss = loss_fn(features, None)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+            losses_seen.append(loss.item())
+
+        metrics = evaluate_retrieval(model, holdout_entries, train_entries, k)
+        metrics.update({'epoch': epoch, 'loss': float(np.mean(losses_seen)) if losses_seen else None,
+                        'seconds': time.perf_counter() - start})
+        history.append(metrics)
+        log(f"epoch {epoch}: {json.dumps(metrics)}")
+
+        if metrics['mrr'] > best['metrics']['mrr']:
+            best = {'epoch': epoch, 'metrics': metrics}
+            stale_epochs = 0
+            model.max_seq_length = deployed_max_seq_length
+            model.save(staging_path)
+            model.max_seq_length = training_max_seq_length
+        else:
+            stale_epochs += 1
+            if stale_epochs >= patience:
+                log(f"Early stopping: no MRR improvement for {patience} epochs")
+                break
+
+        if hard_negatives and epoch < epochs:
+            embeddings = encode_texts(model, texts, batch_size=256)
+
+    if best['epoch']:
+        _replace_dir(staging_path, output_path)
+        log(f"Saved epoch {best['epoch']} (MRR {best['metrics']['mrr']:.4f}) to {output_path}")
+    else:
+        log(f"No epoch beat the baseline (MRR {baseline['mrr']:.4f}); {output_path} left unchanged")
+    return {'baseline': baseline, 'history': history, 'best_epoch': best['epoch'], 'best': best['metrics']}
+
+
+def _replace_dir(source, target):
+    """Ganti folder model lama dengan hasil training; folder lama baru dihapus setelah rename berhasil"""
+    backup = None
+    if os.path.exists(target):
+        backup = target.rstrip('/\\') + '.previous'
+        shutil.rmtree(backup, ignore_errors=True)
+        os.replace(target, backup)
+    os.replace(source, target)
+    if backup:
+        shutil.rmtree(backup, ignore_errors=True)
+
+
+def rebuild_indexes(model_path, entries, index_path, catalog_file=None, course_index=None, batch_size=256):
+    """Bangun ulang knowledge base index (dan course vectors jika sudah pernah dibuat) dengan model baru"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_path, device='cpu')
+    index, stats = build_index(entries, model_path,
+                               encode_fn=lambda texts: encode_texts(model, texts, batch_size=batch_size))
+    index.save(index_path)
+    remove_stale_ann(index_path)
+    rebuilt = [f"{index_path} ({stats['total']} entries)"]
+
+    if course_index and catalog_file and index_exists(course_index) and os.path.exists(catalog_file):
+        from catalog import CourseCatalog, build_course_vectors
+        catalog = CourseCatalog.from_json(catalog_file)
+        build_course_vectors(catalog, lambda texts: encode_texts(model, texts, batch_size=batch_size), course_index,
+                             model_fingerprint(model_path))
+        rebuilt.append(f"{course_index} ({len(catalog.courses)} courses)")
+    return rebuilt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune the embedding model on data.json and rebuild the index")
+    parser.add_argument("data_file", nargs="?", default="data.json")
+    parser.add_argument("--base", default=None,
+                        help=f"model to start from (default: --output if it exists, else {DEFAULT_BASE_MODEL})")
+    parser.add_argument("--output", default="best_embedding_model")
+    parser.add_argument("--index", default="faq_index", help="knowledge base index used for mining and rebuilt after training")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--patience", type=int, default=2, help="epochs without held-out MRR improvement before stopping")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=2e-5)
+    parser.add_argument("--holdout", type=float, default=0.15, help="fraction of patterns held out for evaluation")
+    parser.add_argument("--no-hard-negatives", action="store_true")
+    parser.add_argument("--max-negative-similarity", type=float, default=0.9)
+    parser.add_argument("--max-seq-length", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--catalog", default="dataWeb.json")
+    parser.add_argument("--course-index", default="course_index", help="rebuilt too if it already exists")
+    parser.add_argument("--skip-index", action="store_true", help="only train, do not rebuild the indexes")
+    parser.add_argument("--report", default=None, help="write the training report as JSON")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    base = args.base or (args.output if os.path.isdir(args.output) else DEFAULT_BASE_MODEL)
+    had_onnx = os.path.isdir(os.path.join(args.output, ONNX_DIR))  # folder model lama diganti seluruhnya
+    entries = load_intents(args.data_file)
+    start = time.perf_counter()
+    report = train(entries, base, args.output, index_path=args.index, epochs=args.epochs, patience=args.patience,
+                   batch_size=args.batch_size, lr=args.lr, holdout=args.holdout,
+                   hard_negatives=not args.no_hard_negatives, max_negative_similarity=args.max_negative_similarity,
+                   max_seq_length=args.max_seq_length, seed=args.seed)
+    report.update({'base': base, 'output': args.output, 'train_seconds': time.perf_counter() - start})
+
+    if report['best_epoch'] and not args.skip_index:
+        for rebuilt in rebuild_indexes(args.output, entries, args.index, args.catalog, args.course_index):
+            print(f"Rebuilt {rebuilt}")
+    if report['best_epoch']:
+        if had_onnx:
+            try:
+                for path in export_onnx(args.output):
+                    print(f"Re-exported {path}")
+            except Exception as e:
+                print(f"Could not re-export the ONNX encoder ({e}); run: python encoders.py export {args.output}")
+        else:
+            print(f"If the chatbot uses an ONNX encoder, export it: python encoders.py export {args.output}")
+        print("Answer cache entries embedded with the previous model are dropped when the chatbot restarts")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
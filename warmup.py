@@ -0,0 +1,57 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoader:
+    """
+    Jalankan factory yang berat (mis. membuat RAGChatbot: import torch, load model dan index) di
+    background thread, supaya halaman yang tidak membutuhkannya bisa langsung dirender.
+    - ready / failed / error: status tanpa blocking
+    - result: objek hasil factory (None selama belum siap atau jika gagal)
+    - wait(timeout): tunggu sampai selesai, mengembalikan True jika sudah tidak loading lagi
+    """
+
+    def __init__(self, factory, name="warmup"):
+        self.factory = factory
+        self.name = name
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.elapsed = None
+        self._done = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self.started_at = time.monotonic()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.factory()
+        except Exception as e:
+            self.error = e
+            logger.exception(f"{self.name} failed")
+        finally:
+            self.elapsed = time.monotonic() - self.started_at
+            self._done.set()
+            logger.info(f"{self.name} finished in {self.elapsed:.1f}s")
+
+    @property
+    def ready(self):
+        return self._done.is_set() and self.error is None
+
+    @property
+    def failed(self):
+        return self._done.is_set() and self.error is not None
+
+    def wait(self, timeout=None):
+        self.start()
+        return self._done.wait(timeout)